@@ -3,6 +3,7 @@ from logging.config import fileConfig
 # Importaciones clave para la configuración de la BD
 from sqlalchemy import create_engine
 from sqlalchemy import pool
+from sqlalchemy import text
 
 from alembic import context
 
@@ -21,13 +22,17 @@ from app.database import Base # <-- ¡IMPORTACIÓN CRÍTICA!
 config = context.config
 
 # Interpret the config file for Python logging.
-if config.config_file_name is not None:
+# (app/esquema.py lo desactiva: migra dentro de gunicorn, que ya configuró su logging)
+if config.config_file_name is not None and config.attributes.get("configurar_logging", True):
     fileConfig(config.config_file_name)
 
 # 🚨 DEFINICIÓN DEL TARGET METADATA
 # Conectamos todos nuestros modelos a Alembic
 target_metadata = Base.metadata
 
+# Clave del advisory lock de Postgres que serializa las migraciones (cualquier entero fijo)
+CLAVE_BLOQUEO_MIGRACIONES = 7243101
+
 def get_url():
     """Obtiene la URL de conexión a la BD desde las variables de entorno."""
     # Lee la URL de la variable de entorno DATABASE_URL (definida en el shell o en .env)
@@ -75,6 +80,10 @@ def run_migrations_online() -> None:
         )
 
         with context.begin_transaction():
+            if connection.dialect.name == "postgresql":
+                # Varias instancias que arrancan a la vez: una migra y las demás esperan y,
+                # al leer alembic_version después del lock, ya no tienen nada que aplicar
+                connection.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": CLAVE_BLOQUEO_MIGRACIONES})
             context.run_migrations()
 
 
@@ -0,0 +1,37 @@
+"""Índice compuesto en items_pedido (destino, estado) para la cola de cocina/bar.
+
+Revision ID: 3f9c2d7b8e41
+Revises: a716a4f414a9
+Create Date: 2026-10-16 09:12:04.318552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d7b8e41'
+down_revision: Union[str, Sequence[str], None] = 'a716a4f414a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las bases creadas por el create_all que ejecutaba start.sh ya tienen el índice
+    existentes = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('items_pedido')}
+    if 'ix_items_pedido_destino_estado' in existentes:
+        return
+    op.create_index(
+        'ix_items_pedido_destino_estado',
+        'items_pedido',
+        ['destino', 'estado'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_items_pedido_destino_estado', table_name='items_pedido')
@@ -0,0 +1,38 @@
+"""Índices (fecha_creacion, id) en pedidos para el historial paginado por cursor.
+
+Revision ID: 8b1e4a6c2d90
+Revises: 3f9c2d7b8e41
+Create Date: 2026-10-16 11:40:27.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4a6c2d90'
+down_revision: Union[str, Sequence[str], None] = '3f9c2d7b8e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDICES = {
+    'ix_pedidos_fecha_id': ['fecha_creacion', 'id'],
+    'ix_pedidos_mesero_fecha_id': ['mesero_id', 'fecha_creacion', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las bases creadas por el create_all que ejecutaba start.sh ya tienen los índices
+    existentes = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('pedidos')}
+    for nombre, columnas in INDICES.items():
+        if nombre not in existentes:
+            op.create_index(nombre, 'pedidos', columnas, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for nombre in INDICES:
+        op.drop_index(nombre, table_name='pedidos')
@@ -17,16 +17,97 @@ down_revision: Union[str, Sequence[str], None] = None
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+# Esquema tal como lo creaba create_all en esta revisión; las siguientes agregan el resto
+ENUMS = {
+    'categoriaproducto': ('comida', 'bebestible_general', 'bebestible_alcohol'),
+    'rolusuario': ('mesero', 'cocina', 'bar', 'admin'),
+    'estadomesa': ('libre', 'ocupada', 'pendiente_pago'),
+    'estadopedido': ('nuevo', 'en_preparacion', 'listo_para_servir', 'servido', 'cerrado'),
+    'estadoitem': ('pendiente', 'en_preparacion', 'listo'),
+    'destinoitem': ('cocina', 'bar'),
+}
+
+
+def _enum(nombre: str) -> sa.Enum:
+    return sa.Enum(*ENUMS[nombre], name=nombre)
+
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    # Bases creadas por el create_all que ejecutaba start.sh: ya tienen las tablas
+    if 'productos' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'productos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(), nullable=True),
+        sa.Column('precio', sa.Float(), nullable=True),
+        sa.Column('categoria', _enum('categoriaproducto'), nullable=True),
+        sa.Column('disponible', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_productos_id'), 'productos', ['id'], unique=False)
+    op.create_index(op.f('ix_productos_nombre'), 'productos', ['nombre'], unique=True)
+    op.create_table(
+        'usuarios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(), nullable=True),
+        sa.Column('pin', sa.String(), nullable=True),
+        sa.Column('rol', _enum('rolusuario'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_usuarios_id'), 'usuarios', ['id'], unique=False)
+    op.create_index(op.f('ix_usuarios_nombre'), 'usuarios', ['nombre'], unique=True)
+    op.create_table(
+        'mesas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(), nullable=True),
+        sa.Column('estado', _enum('estadomesa'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('nombre'),
+    )
+    op.create_index(op.f('ix_mesas_id'), 'mesas', ['id'], unique=False)
+    op.create_table(
+        'pedidos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('mesa_id', sa.Integer(), nullable=True),
+        sa.Column('mesero_id', sa.Integer(), nullable=True),
+        sa.Column('estado', _enum('estadopedido'), nullable=True),
+        sa.Column('total', sa.Float(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['mesa_id'], ['mesas.id']),
+        sa.ForeignKeyConstraint(['mesero_id'], ['usuarios.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_pedidos_id'), 'pedidos', ['id'], unique=False)
+    op.create_table(
+        'items_pedido',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('pedido_id', sa.Integer(), nullable=True),
+        sa.Column('producto_id', sa.Integer(), nullable=True),
+        sa.Column('cantidad', sa.Integer(), nullable=True),
+        sa.Column('estado', _enum('estadoitem'), nullable=True),
+        sa.Column('destino', _enum('destinoitem'), nullable=True),
+        sa.ForeignKeyConstraint(['pedido_id'], ['pedidos.id']),
+        sa.ForeignKeyConstraint(['producto_id'], ['productos.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_items_pedido_id'), 'items_pedido', ['id'], unique=False)
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_index(op.f('ix_items_pedido_id'), table_name='items_pedido')
+    op.drop_table('items_pedido')
+    op.drop_index(op.f('ix_pedidos_id'), table_name='pedidos')
+    op.drop_table('pedidos')
+    op.drop_index(op.f('ix_mesas_id'), table_name='mesas')
+    op.drop_table('mesas')
+    op.drop_index(op.f('ix_usuarios_nombre'), table_name='usuarios')
+    op.drop_index(op.f('ix_usuarios_id'), table_name='usuarios')
+    op.drop_table('usuarios')
+    op.drop_index(op.f('ix_productos_nombre'), table_name='productos')
+    op.drop_index(op.f('ix_productos_id'), table_name='productos')
+    op.drop_table('productos')
+    for nombre in ENUMS:
+        sa.Enum(name=nombre).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,42 @@
+"""Tabla eventos: registro con seq de los eventos enviados a los WebSockets.
+
+Revision ID: a9d3e6f1c8b2
+Revises: f2a7c1e5b9d4
+Create Date: 2026-10-16 20:12:55.604193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3e6f1c8b2'
+down_revision: Union[str, Sequence[str], None] = 'f2a7c1e5b9d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las bases creadas por el create_all que ejecutaba start.sh ya tienen la tabla
+    if 'eventos' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'eventos',
+        sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('tipo', sa.String(length=64), nullable=False),
+        sa.Column('topicos', sa.Text(), nullable=False),
+        sa.Column('datos', sa.Text(), nullable=False),
+        sa.Column('creado_en', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True,
+    )
+    op.create_index(op.f('ix_eventos_creado_en'), 'eventos', ['creado_en'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_eventos_creado_en'), table_name='eventos')
+    op.drop_table('eventos')
@@ -0,0 +1,163 @@
+"""Montos en centavos (BIGINT), precio unitario en cada ítem y total del pedido por triggers.
+
+Revision ID: b5e8c3d1f7a2
+Revises: a9d3e6f1c8b2
+Create Date: 2026-10-16 23:41:37.208115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e8c3d1f7a2'
+down_revision: Union[str, Sequence[str], None] = 'a9d3e6f1c8b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (tabla, columna float, columna en centavos)
+MONTOS = [
+    ('productos', 'precio', 'precio_centavos'),
+    ('pedidos', 'total', 'total_centavos'),
+    ('resumen_ventas', 'ingresos', 'ingresos_centavos'),
+]
+
+# Copia de app/dinero.py al momento de esta revisión
+TRIGGERS = {
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION items_pedido_total_insertar() RETURNS trigger AS $$
+        BEGIN
+            UPDATE pedidos SET total_centavos = pedidos.total_centavos + nuevos.suma
+            FROM (
+                SELECT pedido_id, SUM(COALESCE(cantidad, 0) * precio_unitario_centavos) AS suma
+                FROM items_nuevos GROUP BY pedido_id
+            ) AS nuevos
+            WHERE pedidos.id = nuevos.pedido_id;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_insertar AFTER INSERT ON items_pedido
+        REFERENCING NEW TABLE AS items_nuevos
+        FOR EACH STATEMENT EXECUTE FUNCTION items_pedido_total_insertar()
+        """,
+        """
+        CREATE OR REPLACE FUNCTION items_pedido_total_cambiar() RETURNS trigger AS $$
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos - COALESCE(OLD.cantidad, 0) * OLD.precio_unitario_centavos
+            WHERE id = OLD.pedido_id;
+            IF TG_OP = 'UPDATE' THEN
+                UPDATE pedidos SET total_centavos = total_centavos + COALESCE(NEW.cantidad, 0) * NEW.precio_unitario_centavos
+                WHERE id = NEW.pedido_id;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_cambiar
+        AFTER DELETE OR UPDATE OF cantidad, precio_unitario_centavos, pedido_id ON items_pedido
+        FOR EACH ROW EXECUTE FUNCTION items_pedido_total_cambiar()
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TRIGGER items_pedido_total_insertar AFTER INSERT ON items_pedido
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos + COALESCE(NEW.cantidad, 0) * NEW.precio_unitario_centavos
+            WHERE id = NEW.pedido_id;
+        END
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_modificar AFTER UPDATE OF cantidad, precio_unitario_centavos, pedido_id
+        ON items_pedido
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos - COALESCE(OLD.cantidad, 0) * OLD.precio_unitario_centavos
+            WHERE id = OLD.pedido_id;
+            UPDATE pedidos SET total_centavos = total_centavos + COALESCE(NEW.cantidad, 0) * NEW.precio_unitario_centavos
+            WHERE id = NEW.pedido_id;
+        END
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_borrar AFTER DELETE ON items_pedido
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos - COALESCE(OLD.cantidad, 0) * OLD.precio_unitario_centavos
+            WHERE id = OLD.pedido_id;
+        END
+        """,
+    ],
+}
+
+BORRAR_TRIGGERS = {
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS items_pedido_total_insertar ON items_pedido",
+        "DROP TRIGGER IF EXISTS items_pedido_total_cambiar ON items_pedido",
+        "DROP FUNCTION IF EXISTS items_pedido_total_insertar()",
+        "DROP FUNCTION IF EXISTS items_pedido_total_cambiar()",
+    ],
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS items_pedido_total_insertar",
+        "DROP TRIGGER IF EXISTS items_pedido_total_modificar",
+        "DROP TRIGGER IF EXISTS items_pedido_total_borrar",
+    ],
+}
+
+
+def _a_centavos(columna: str) -> str:
+    # En Postgres se pasa por numeric (15 dígitos significativos): 0.285 redondea a 29 y no
+    # a 28 como el double 28.4999…, igual que app.dinero.a_centavos
+    if op.get_bind().dialect.name == 'postgresql':
+        return f"CAST(ROUND(CAST({columna} AS NUMERIC) * 100) AS BIGINT)"
+    return f"CAST(ROUND({columna} * 100) AS INTEGER)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialecto = op.get_bind().dialect.name
+    for tabla, vieja, nueva in MONTOS:
+        op.add_column(tabla, sa.Column(nueva, sa.BigInteger(), nullable=True))
+        op.execute(f"UPDATE {tabla} SET {nueva} = {_a_centavos(vieja)}")
+    op.add_column('items_pedido', sa.Column('precio_unitario_centavos', sa.BigInteger(), nullable=True))
+    # Los ítems existentes no guardaban el precio: se les pone el actual del producto. El total
+    # de sus pedidos se conserva tal como se cobró
+    op.execute("""
+        UPDATE items_pedido SET precio_unitario_centavos = (
+            SELECT productos.precio_centavos FROM productos WHERE productos.id = items_pedido.producto_id
+        )
+    """)
+
+    op.execute("UPDATE pedidos SET total_centavos = 0 WHERE total_centavos IS NULL")
+    op.execute("UPDATE items_pedido SET precio_unitario_centavos = 0 WHERE precio_unitario_centavos IS NULL")
+    with op.batch_alter_table('pedidos') as batch:
+        batch.alter_column('total_centavos', existing_type=sa.BigInteger(), nullable=False, server_default='0')
+        batch.drop_column('total')
+    with op.batch_alter_table('items_pedido') as batch:
+        batch.alter_column('precio_unitario_centavos', existing_type=sa.BigInteger(), nullable=False,
+                           server_default='0')
+    with op.batch_alter_table('resumen_ventas') as batch:
+        batch.alter_column('ingresos_centavos', existing_type=sa.BigInteger(), nullable=False)
+        batch.drop_column('ingresos')
+    with op.batch_alter_table('productos') as batch:
+        batch.drop_column('precio')
+
+    # Después de convertir los datos: el UPDATE de precio_unitario_centavos no debe sumar
+    # otra vez los ítems existentes al total
+    for sentencia in TRIGGERS.get(dialecto, []):
+        op.execute(sentencia)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for sentencia in BORRAR_TRIGGERS.get(op.get_bind().dialect.name, []):
+        op.execute(sentencia)
+    for tabla, vieja, nueva in MONTOS:
+        op.add_column(tabla, sa.Column(vieja, sa.Float(), nullable=True))
+        op.execute(f"UPDATE {tabla} SET {vieja} = {nueva} / 100.0")
+        with op.batch_alter_table(tabla) as batch:
+            if tabla == 'resumen_ventas':
+                batch.alter_column(vieja, existing_type=sa.Float(), nullable=False)
+            batch.drop_column(nueva)
+    with op.batch_alter_table('items_pedido') as batch:
+        batch.drop_column('precio_unitario_centavos')
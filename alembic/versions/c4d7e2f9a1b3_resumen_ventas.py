@@ -0,0 +1,42 @@
+"""Tabla resumen_ventas: ventas acumuladas por día y mesero, mesa o producto.
+
+Revision ID: c4d7e2f9a1b3
+Revises: 8b1e4a6c2d90
+Create Date: 2026-10-16 13:05:51.226840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d7e2f9a1b3'
+down_revision: Union[str, Sequence[str], None] = '8b1e4a6c2d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las bases creadas por el create_all que ejecutaba start.sh ya tienen la tabla
+    if 'resumen_ventas' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'resumen_ventas',
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('dimension', sa.Enum('mesero', 'mesa', 'producto', name='dimensionventa'), nullable=False),
+        sa.Column('clave', sa.Integer(), nullable=False),
+        sa.Column('pedidos', sa.Integer(), nullable=False),
+        sa.Column('unidades', sa.Integer(), nullable=False),
+        sa.Column('ingresos', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('dia', 'dimension', 'clave'),
+    )
+    # Los pedidos ya cerrados se cargan después con: python -m app.reportes
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('resumen_ventas')
+    sa.Enum(name='dimensionventa').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,41 @@
+"""Contadores items_total / items_listos en pedidos para avanzar a listo_para_servir.
+
+Revision ID: d8a3f5b7c2e6
+Revises: c4d7e2f9a1b3
+Create Date: 2026-10-16 14:22:08.517390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a3f5b7c2e6'
+down_revision: Union[str, Sequence[str], None] = 'c4d7e2f9a1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # El create_all que ejecutaba start.sh no agregaba columnas a tablas existentes
+    columnas = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('pedidos')}
+    if 'items_total' not in columnas:
+        op.add_column('pedidos', sa.Column('items_total', sa.Integer(), nullable=False, server_default='0'))
+    if 'items_listos' not in columnas:
+        op.add_column('pedidos', sa.Column('items_listos', sa.Integer(), nullable=False, server_default='0'))
+    # Pedidos existentes: contar sus ítems
+    op.execute("""
+        UPDATE pedidos SET
+            items_total = (SELECT COUNT(*) FROM items_pedido WHERE items_pedido.pedido_id = pedidos.id),
+            items_listos = (SELECT COUNT(*) FROM items_pedido
+                            WHERE items_pedido.pedido_id = pedidos.id AND items_pedido.estado = 'listo')
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pedidos', 'items_listos')
+    op.drop_column('pedidos', 'items_total')
@@ -0,0 +1,42 @@
+"""Tabla claves_idempotencia para la cabecera Idempotency-Key.
+
+Revision ID: e1f6b9d4a7c3
+Revises: d8a3f5b7c2e6
+Create Date: 2026-10-16 15:48:33.902764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f6b9d4a7c3'
+down_revision: Union[str, Sequence[str], None] = 'd8a3f5b7c2e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las bases creadas por el create_all que ejecutaba start.sh ya tienen la tabla
+    if 'claves_idempotencia' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'claves_idempotencia',
+        sa.Column('usuario_id', sa.Integer(), nullable=False),
+        sa.Column('clave', sa.String(length=255), nullable=False),
+        sa.Column('ruta', sa.String(), nullable=False),
+        sa.Column('huella', sa.String(length=64), nullable=False),
+        sa.Column('respuesta', sa.Text(), nullable=True),
+        sa.Column('creada_en', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('usuario_id', 'clave'),
+    )
+    op.create_index(op.f('ix_claves_idempotencia_creada_en'), 'claves_idempotencia', ['creada_en'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_claves_idempotencia_creada_en'), table_name='claves_idempotencia')
+    op.drop_table('claves_idempotencia')
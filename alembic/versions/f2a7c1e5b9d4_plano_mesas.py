@@ -0,0 +1,41 @@
+"""Índice de pedidos abiertos por mesa para el plano y estado de mesas según sus pedidos.
+
+Revision ID: f2a7c1e5b9d4
+Revises: e1f6b9d4a7c3
+Create Date: 2026-10-16 19:05:41.228307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c1e5b9d4'
+down_revision: Union[str, Sequence[str], None] = 'e1f6b9d4a7c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las bases creadas por el create_all que ejecutaba start.sh ya tienen el índice
+    existentes = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('pedidos')}
+    if 'ix_pedidos_mesa_estado' not in existentes:
+        op.create_index('ix_pedidos_mesa_estado', 'pedidos', ['mesa_id', 'estado'], unique=False)
+    # Hasta ahora nada mantenía mesas.estado: se recalcula desde los pedidos abiertos
+    op.execute("UPDATE mesas SET estado = 'libre'")
+    op.execute("""
+        UPDATE mesas SET estado = 'pendiente_pago' WHERE EXISTS (
+            SELECT 1 FROM pedidos WHERE pedidos.mesa_id = mesas.id AND pedidos.estado <> 'cerrado')
+    """)
+    op.execute("""
+        UPDATE mesas SET estado = 'ocupada' WHERE EXISTS (
+            SELECT 1 FROM pedidos WHERE pedidos.mesa_id = mesas.id AND pedidos.estado NOT IN ('servido', 'cerrado'))
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pedidos_mesa_estado', table_name='pedidos')
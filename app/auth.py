@@ -1,10 +1,19 @@
 # app/auth.py
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Deque, Dict
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 
+from .metricas import registro
+
 SECRET_KEY = "super_secret_key_123"  # cámbiala por una variable de entorno en producción
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
@@ -23,6 +32,111 @@ def verify_password(plain_password, hashed_password):
             detail="Error al verificar contraseña"
         )
 
+# === VERIFICACIÓN EN EJECUTOR DEDICADO ===
+# bcrypt es CPU intensivo; en el threadpool compartido un pico de logins deja sin hilos
+# al resto de las rutas. Se verifica en un pool propio (procesos por defecto, así corre
+# en paralelo en varios núcleos) y con límites de admisión que rechazan el exceso con 429.
+HASH_EJECUTOR = os.environ.get("HASH_EJECUTOR", "procesos")  # 'procesos' o 'hilos'
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", "2"))
+LOGIN_MAX_CONCURRENTES = int(os.environ.get("LOGIN_MAX_CONCURRENTES", str(HASH_WORKERS * 4)))
+LOGIN_MAX_INTENTOS_USUARIO = int(os.environ.get("LOGIN_MAX_INTENTOS_USUARIO", "5"))
+LOGIN_VENTANA_SEG = float(os.environ.get("LOGIN_VENTANA_SEG", "60"))
+
+LATENCIA_HASH = registro.histograma(
+    "auth_hash_verificacion_segundos", "Duración de la verificación bcrypt, incluida la espera en el pool"
+)
+LOGINS_RECHAZADOS = registro.contador(
+    "auth_login_rechazados_total", "Intentos de login rechazados por control de admisión", ["motivo"]
+)
+
+_ejecutor_hash: Executor | None = None
+
+def _verificar(plain_password, hashed_password) -> bool:
+    # Función de módulo para que el pool de procesos pueda serializarla
+    return pwd_context.verify(plain_password, hashed_password)
+
+def _obtener_ejecutor_hash() -> Executor:
+    global _ejecutor_hash
+    if _ejecutor_hash is None:
+        if HASH_EJECUTOR == "hilos":
+            _ejecutor_hash = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+        else:
+            # spawn: no se hereda el estado del worker (event loop, conexiones, hilos)
+            _ejecutor_hash = ProcessPoolExecutor(
+                max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+    return _ejecutor_hash
+
+def cerrar_ejecutor_hash():
+    global _ejecutor_hash
+    if _ejecutor_hash is not None:
+        _ejecutor_hash.shutdown(wait=False, cancel_futures=True)
+        _ejecutor_hash = None
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """Como verify_password, pero en el ejecutor dedicado y midiendo la latencia."""
+    loop = asyncio.get_running_loop()
+    inicio = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_obtener_ejecutor_hash(), _verificar, plain_password, hashed_password)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Error al verificar contraseña"
+        )
+    finally:
+        LATENCIA_HASH.observe(time.perf_counter() - inicio)
+
+class ControlAdmisionLogin:
+    """
+    Límites de admisión para /token: verificaciones simultáneas globales, una verificación
+    en curso por usuario y un máximo de intentos por usuario dentro de una ventana.
+    Se usa desde el event loop (un solo hilo), por lo que no necesita lock.
+    """
+    def __init__(self, max_concurrentes: int = LOGIN_MAX_CONCURRENTES,
+                 max_intentos: int = LOGIN_MAX_INTENTOS_USUARIO, ventana: float = LOGIN_VENTANA_SEG):
+        self.max_concurrentes = max_concurrentes
+        self.max_intentos = max_intentos
+        self.ventana = ventana
+        self._en_curso = 0
+        self._usuarios_en_curso: set = set()
+        self._intentos: Dict[str, Deque[float]] = {}
+
+    def _rechazar(self, motivo: str, detalle: str, reintentar_en: int):
+        LOGINS_RECHAZADOS.inc(motivo=motivo)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detalle,
+            headers={"Retry-After": str(reintentar_en)},
+        )
+
+    def admitir(self, usuario: str):
+        """Registra el intento o lanza 429. Si admite, hay que llamar a liberar()."""
+        ahora = time.monotonic()
+        intentos = self._intentos.setdefault(usuario, deque())
+        while intentos and ahora - intentos[0] > self.ventana:
+            intentos.popleft()
+        if len(intentos) >= self.max_intentos:
+            self._rechazar("usuario_intentos", "Demasiados intentos de login. Intenta más tarde.",
+                           int(self.ventana - (ahora - intentos[0])) + 1)
+        if usuario in self._usuarios_en_curso:
+            self._rechazar("usuario_en_curso", "Ya hay un login en curso para este usuario.", 1)
+        if self._en_curso >= self.max_concurrentes:
+            self._rechazar("global", "Servidor ocupado procesando logins. Intenta de nuevo.", 1)
+        intentos.append(ahora)
+        self._en_curso += 1
+        self._usuarios_en_curso.add(usuario)
+
+    def liberar(self, usuario: str):
+        self._en_curso -= 1
+        self._usuarios_en_curso.discard(usuario)
+        # Purga usuarios sin intentos recientes para acotar la memoria
+        if len(self._intentos) > 10_000:
+            ahora = time.monotonic()
+            self._intentos = {u: d for u, d in self._intentos.items() if d and ahora - d[-1] <= self.ventana}
+
+admision_login = ControlAdmisionLogin()
+
 def get_password_hash(password):
     """Hashea una contraseña (PIN)."""
     return pwd_context.hash(password)
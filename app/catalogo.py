@@ -0,0 +1,135 @@
+# app/catalogo.py
+"""
+Caché en memoria del catálogo de productos (menú).
+El menú cambia un par de veces al día pero cada tablet lo descarga al abrir la pantalla:
+se guarda una instantánea versionada que se invalida al crear/actualizar productos y se
+expone con ETag para responder 304 cuando el cliente ya tiene la versión vigente. El JSON
+del menú completo se codifica una vez por instantánea.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from . import models
+from .paginacion import CABECERA_CURSOR, codificar_cursor, decodificar_cursor
+from .serializacion import RespuestaJSON, a_json, responder
+
+# Tope de antigüedad de la instantánea; cubre cambios hechos desde otro worker
+CATALOGO_TTL_SEG = float(os.environ.get("CATALOGO_TTL_SEG", "60"))
+
+
+@dataclass(frozen=True)
+class SnapshotCatalogo:
+    version: int
+    productos: List[dict]
+    # Hash del contenido: el mismo catálogo produce el mismo ETag en todos los workers
+    digest: str
+    cargado_en: float
+
+    def etag(self, skip: int = 0, limit: Optional[int] = None, despues_de: Optional[int] = None) -> str:
+        if despues_de is not None:
+            return f'"{self.digest}-c{despues_de}-{skip}-{limit}"'
+        if skip == 0 and (limit is None or limit >= len(self.productos)):
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{skip}-{limit}"'
+
+    @cached_property
+    def json_completo(self) -> bytes:
+        return a_json(self.productos)
+
+    def pagina(self, skip: int = 0, limit: Optional[int] = None,
+               despues_de: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Página del catálogo (ordenado por id) y el id tras el cual sigue la próxima, o None.
+        Con `despues_de` la página empieza por búsqueda binaria, sin recorrer las anteriores.
+        """
+        inicio = 0 if despues_de is None else bisect.bisect_right(self.productos, despues_de, key=lambda p: p["id"])
+        inicio += skip
+        fin = None if limit is None else inicio + limit
+        productos = self.productos[inicio:fin]
+        if fin is None or fin >= len(self.productos) or not productos:
+            return productos, None
+        return productos, productos[-1]["id"]
+
+
+class CatalogoCache:
+    def __init__(self, ttl: float = CATALOGO_TTL_SEG):
+        self._lock = threading.Lock()
+        self._ttl = ttl
+        self._version = 0
+        self._snapshot: Optional[SnapshotCatalogo] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidar(self):
+        """Incrementa la versión; la siguiente lectura recarga desde la BD."""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+    def obtener(self, db: Session) -> SnapshotCatalogo:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version \
+                and time.monotonic() - snapshot.cargado_en < self._ttl:
+            return snapshot
+        version = self._version
+        productos = [
+            {
+                "id": p.id,
+                "nombre": p.nombre,
+                "precio": p.precio,
+                "categoria": p.categoria.value,
+                "disponible": p.disponible,
+            }
+            for p in db.query(models.Producto).order_by(models.Producto.id)
+        ]
+        digest = hashlib.sha1(json.dumps(productos, sort_keys=True).encode()).hexdigest()
+        snapshot = SnapshotCatalogo(version, productos, digest, time.monotonic())
+        with self._lock:
+            # Si hubo una invalidación mientras se leía, no se publica la lectura vieja
+            if self._version == version:
+                self._snapshot = snapshot
+        return snapshot
+
+
+def no_modificado(request: Request, etag: str) -> bool:
+    """True si el If-None-Match del cliente ya incluye el ETag vigente."""
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    etiquetas = [e.strip().removeprefix("W/") for e in cabecera.split(",")]
+    return "*" in etiquetas or etag in etiquetas
+
+
+def responder_catalogo(request: Request, snapshot: SnapshotCatalogo,
+                       skip: int = 0, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    Devuelve la página del catálogo, o un 304 vacío si el cliente ya la tiene.
+    `cursor` es el de la cabecera X-Cursor-Siguiente de la página anterior.
+    """
+    despues_de = decodificar_cursor(cursor, [int])[0] if cursor else None
+    etag = snapshot.etag(skip, limit, despues_de)
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+    productos, ultimo = snapshot.pagina(skip, limit, despues_de)
+    if ultimo is not None:
+        cabeceras[CABECERA_CURSOR] = codificar_cursor(ultimo)
+    if no_modificado(request, etag):
+        return Response(status_code=304, headers=cabeceras)
+    if len(productos) == len(snapshot.productos):
+        return RespuestaJSON(snapshot.json_completo, headers=cabeceras)
+    return responder(productos, headers=cabeceras)
+
+
+catalogo = CatalogoCache()
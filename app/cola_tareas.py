@@ -0,0 +1,130 @@
+# app/cola_tareas.py
+"""
+Cola en memoria de ítems pendientes por destino ('cocina' / 'bar').
+Las pantallas de cocina y bar se refrescan cada pocos segundos; esta cola les responde
+sin ir a la base de datos. crud la actualiza de forma incremental al crear pedidos y
+marcar ítems listos, y una reconciliación periódica contra la BD corrige cualquier
+desviación (por ejemplo, cambios hechos por otro worker). El JSON de cada destino se
+codifica una vez y se reutiliza hasta la siguiente mutación: todas las tablets que
+refrescan entre dos cambios reciben los mismos bytes.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from . import models
+from .serializacion import a_json
+
+
+def producto_tarea(producto: models.Producto) -> dict:
+    return {
+        "id": producto.id,
+        "nombre": producto.nombre,
+        "precio": producto.precio,
+        "categoria": producto.categoria.value,
+        "disponible": producto.disponible,
+    }
+
+
+def tarea_desde_item(item: models.ItemPedido) -> dict:
+    """Convierte un ItemPedido (con producto y pedido.mesa cargados) al formato de TareaItem."""
+    return {
+        "id": item.id,
+        "cantidad": item.cantidad,
+        "estado": item.estado.value,
+        "destino": item.destino.value,
+        "producto": producto_tarea(item.producto),
+        "pedido": {
+            "id": item.pedido.id,
+            "mesa": {"nombre": item.pedido.mesa.nombre},
+        },
+    }
+
+
+class ColaTareas:
+    """
+    Ítems pendientes indexados por destino e id, en orden de llegada.
+    Cada mutación recibe un número de secuencia; así una reconciliación que leyó la BD
+    antes de una mutación concurrente no la pisa al reemplazar el contenido.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tareas: Dict[str, "OrderedDict[int, dict]"] = {d.value: OrderedDict() for d in models.DestinoItem}
+        self._cargado: Dict[str, bool] = {d.value: False for d in models.DestinoItem}
+        self._seq = 0
+        # destino -> {item_id: seq de la última mutación local (alta o baja)}
+        self._altas: Dict[str, Dict[int, int]] = {d.value: {} for d in models.DestinoItem}
+        self._bajas: Dict[str, Dict[int, int]] = {d.value: {} for d in models.DestinoItem}
+        # destino -> JSON de la lista vigente (None: se recodifica en la próxima lectura)
+        self._json: Dict[str, Optional[bytes]] = {d.value: None for d in models.DestinoItem}
+
+    def marca(self) -> int:
+        """Secuencia actual; tomarla antes de leer la BD para una reconciliación."""
+        with self._lock:
+            return self._seq
+
+    def listar(self, destino: str) -> Optional[List[dict]]:
+        """Ítems pendientes del destino, o None si la cola aún no se ha cargado."""
+        with self._lock:
+            if not self._cargado[destino]:
+                return None
+            return list(self._tareas[destino].values())
+
+    def listar_json(self, destino: str) -> Optional[bytes]:
+        """Como `listar`, ya codificado en JSON."""
+        with self._lock:
+            if not self._cargado[destino]:
+                return None
+            if self._json[destino] is None:
+                self._json[destino] = a_json(list(self._tareas[destino].values()))
+            return self._json[destino]
+
+    def agregar(self, tareas: Iterable[dict]):
+        with self._lock:
+            for tarea in tareas:
+                destino = tarea["destino"]
+                self._seq += 1
+                self._tareas[destino][tarea["id"]] = tarea
+                self._altas[destino][tarea["id"]] = self._seq
+                self._bajas[destino].pop(tarea["id"], None)
+                self._json[destino] = None
+
+    def quitar(self, item_id: int, destino: str):
+        with self._lock:
+            self._seq += 1
+            self._tareas[destino].pop(item_id, None)
+            self._bajas[destino][item_id] = self._seq
+            self._altas[destino].pop(item_id, None)
+            self._json[destino] = None
+
+    def reemplazar(self, destino: str, tareas: Iterable[dict], desde: int):
+        """
+        Reemplaza el contenido del destino con una lectura de la BD iniciada en `desde`.
+        Se conservan las mutaciones locales posteriores a esa lectura.
+        """
+        with self._lock:
+            altas, bajas = self._altas[destino], self._bajas[destino]
+            nuevas = OrderedDict()
+            for tarea in tareas:
+                if bajas.get(tarea["id"], 0) > desde:
+                    continue
+                nuevas[tarea["id"]] = tarea
+            for item_id, tarea in self._tareas[destino].items():
+                if altas.get(item_id, 0) > desde and item_id not in nuevas:
+                    nuevas[item_id] = tarea
+            self._tareas[destino] = OrderedDict(sorted(nuevas.items()))
+            self._cargado[destino] = True
+            self._json[destino] = None
+            # Las marcas anteriores a la lectura ya están reflejadas en la BD
+            self._altas[destino] = {k: v for k, v in altas.items() if v > desde}
+            self._bajas[destino] = {k: v for k, v in bajas.items() if v > desde}
+
+    def invalidar(self, destino: Optional[str] = None):
+        """Fuerza una recarga desde la BD en la próxima lectura."""
+        with self._lock:
+            for d in ([destino] if destino else list(self._cargado)):
+                self._cargado[d] = False
+
+
+cola_tareas = ColaTareas()
@@ -5,14 +5,31 @@ Esta versión usa SQLAlchemy ORM y espera que los modelos en app.models estén d
 Incluye validaciones básicas y raise de HTTPException en casos esperados.
 """
 
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import Select, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException, status
-from . import models, schemas
-from typing import List
+from . import estados, idempotencia, models, plano, schemas
+from .catalogo import catalogo, SnapshotCatalogo
+from .cola_tareas import cola_tareas, producto_tarea, tarea_desde_item
+from .eventos import bus
+from .paginacion import aplicar_keyset, cortar_pagina
+from .reportes import acumular_pedido_cerrado
+from typing import List, Optional, Tuple
 
 # Productos
-def get_productos(db: Session, skip: int = 0, limit: int = 100) -> List[models.Producto]:
-    return db.query(models.Producto).offset(skip).limit(limit).all()
+def get_productos(db: Session, despues_de: Optional[int] = None, limit: int = 100) -> List[models.Producto]:
+    """Productos por id a partir de `despues_de` (keyset, sin OFFSET)."""
+    consulta = db.query(models.Producto)
+    if despues_de is not None:
+        consulta = consulta.filter(models.Producto.id > despues_de)
+    return consulta.order_by(models.Producto.id).limit(limit).all()
+
+def get_catalogo(db: Session) -> SnapshotCatalogo:
+    """Instantánea cacheada del menú completo; sólo consulta la BD si fue invalidada o expiró."""
+    return catalogo.obtener(db)
 
 def create_producto(db: Session, producto: schemas.ProductoCreate) -> models.Producto:
     # Validaciones básicas
@@ -29,8 +46,12 @@ def create_producto(db: Session, producto: schemas.ProductoCreate) -> models.Pro
         disponible=producto.disponible if producto.disponible is not None else True
     )
     db.add(db_producto)
+    db.flush()
+    bus.publicar(db, "catalogo_actualizado", {"producto_id": db_producto.id})
     db.commit()
     db.refresh(db_producto)
+    # Todo cambio de productos debe invalidar el catálogo tras el commit
+    catalogo.invalidar()
     return db_producto
 
 # Usuarios / Autenticación
@@ -39,86 +60,480 @@ def get_user_by_name(db: Session, username: str):
     return db.query(models.Usuario).filter(models.Usuario.nombre == username).first()
 
 # Pedidos y items
-def create_pedido(db: Session, pedido: schemas.PedidoCreate) -> models.Pedido:
-    # Validar mesa y mesero
-    mesa = db.query(models.Mesa).filter(models.Mesa.id == pedido.mesa_id).first()
-    if not mesa:
+def _topicos_pedido(mesa_id: int, mesero_id: int, *destinos: str) -> List[str]:
+    """Tópicos de WebSocket interesados en un pedido: su mesa, su mesero y los destinos."""
+    return [f"mesa:{mesa_id}", f"mesero:{mesero_id}", *(f"destino:{d}" for d in destinos)]
+
+def _destino_para(producto: models.Producto) -> models.DestinoItem:
+    """La comida va a cocina; todo lo bebestible va al bar."""
+    if producto.categoria == models.CategoriaProducto.comida:
+        return models.DestinoItem.cocina
+    return models.DestinoItem.bar
+
+def create_pedido(db: Session, pedido: schemas.PedidoCreate) -> dict:
+    """
+    Crea el pedido y sus ítems como una sola unidad de trabajo.
+    Los productos se leen en una sola consulta y los ítems se insertan en lote junto al
+    pedido con un único commit, así el número de sentencias no depende de la cantidad de
+    ítems. La mesa pasa a 'ocupada' en la misma transacción; si una validación falla no
+    hay commit y nada queda escrito.
+    """
+    # Validar mesa (ocupándola) y mesero
+    mesa = plano.ocupar_mesa(db, pedido.mesa_id)
+    if mesa is None:
         raise HTTPException(status_code=400, detail="Mesa no encontrada.")
-    mesero = db.query(models.Usuario).filter(models.Usuario.id == pedido.mesero_id).first()
-    if not mesero:
+    if db.query(models.Usuario.id).filter(models.Usuario.id == pedido.mesero_id).first() is None:
         raise HTTPException(status_code=400, detail="Mesero no encontrado.")
 
+    productos = _leer_productos(db, pedido.items)
+    filas_items = _filas_items(pedido.items, productos)
+
+    # El total arranca en 0 y lo suman los triggers de items_pedido (ver app/dinero.py)
     db_pedido = models.Pedido(
         mesa_id=pedido.mesa_id,
         mesero_id=pedido.mesero_id,
         estado=models.EstadoPedido.nuevo,
-        total=0.0
+        items_total=len(filas_items),
+        items_listos=0
     )
     db.add(db_pedido)
+    db.flush()
+    insertados = _insertar_items(db, db_pedido.id, filas_items)
+    total = _total_pedido(db, db_pedido.id)
+    # Las tareas se arman antes del commit, que expira los productos cargados
+    tareas = _tareas(insertados, productos, db_pedido.id, mesa.nombre)
+    bus.publicar(db, "pedido_creado", {
+        "pedido_id": db_pedido.id,
+        "mesa_id": pedido.mesa_id,
+        "mesero_id": pedido.mesero_id,
+        "total": total,
+        "items": [
+            {"id": fila.id, "producto_id": fila.producto_id, "cantidad": fila.cantidad, "destino": fila.destino.value}
+            for fila in insertados
+        ],
+    }, topicos=_topicos_pedido(pedido.mesa_id, pedido.mesero_id, *{fila.destino.value for fila in insertados}))
+    plano.publicar_mesa(db, pedido.mesa_id)
+    # La respuesta se arma con lo insertado, sin volver a leer el pedido tras el commit
+    respuesta = {
+        "id": db_pedido.id,
+        "mesa_id": pedido.mesa_id,
+        "mesero_id": pedido.mesero_id,
+        "estado": models.EstadoPedido.nuevo,
+        "total": total,
+        "items": _items_respuesta(insertados),
+    }
+    idempotencia.registrar(db, respuesta)
     db.commit()
-    db.refresh(db_pedido)
-
-    total = 0.0
-    items_created = []
-    for item in pedido.items:
-        producto = db.query(models.Producto).filter(models.Producto.id == item.producto_id).first()
-        if not producto:
-            # Rollback parcial y error
-            db.delete(db_pedido)
-            db.commit()
-            raise HTTPException(status_code=400, detail=f"Producto con id {item.producto_id} no encontrado.")
-        db_item = models.ItemPedido(
-            pedido_id=db_pedido.id,
-            producto_id=item.producto_id,
-            cantidad=item.cantidad,
-            estado=models.EstadoItem.pendiente,
-            destino=models.DestinoItem.cocina if producto.categoria == "comida" else models.DestinoItem.bar
+
+    # Los ítems nuevos entran a la cola en memoria sin volver a leerlos
+    cola_tareas.agregar(tareas)
+    return respuesta
+
+def agregar_items(db: Session, pedido_id: int, items: List[schemas.ItemPedidoCreate],
+                  mesero_id: Optional[int] = None) -> dict:
+    """
+    Agrega una ronda de ítems a un pedido abierto, sin tocar los que ya tiene.
+    Un solo UPDATE suma los ítems a items_total, devuelve el pedido a 'en_preparacion' si
+    ya estaba completo y trae el nombre de la mesa; después se insertan sólo los ítems
+    nuevos, en lote, y los triggers de items_pedido suman su importe al total. Los nuevos
+    van a la cola de cocina/bar como en create_pedido. `mesero_id` limita el pedido a ese
+    mesero (403 si es de otro).
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="Indica al menos un ítem.")
+    productos = _leer_productos(db, items)
+    filas_items = _filas_items(items, productos)
+
+    Pedido = models.Pedido
+    condiciones = [Pedido.id == pedido_id, Pedido.estado != models.EstadoPedido.cerrado]
+    if mesero_id is not None:
+        condiciones.append(Pedido.mesero_id == mesero_id)
+    pedido = db.execute(
+        update(Pedido)
+        .where(*condiciones)
+        .values(
+            items_total=Pedido.items_total + len(filas_items),
+            estado=estados.estado_tras_agregar_items(),
         )
-        db.add(db_item)
-        db.commit()
-        db.refresh(db_item)
-        items_created.append(db_item)
-        total += (producto.precio or 0.0) * item.cantidad
-
-    # Actualizar total
-    db_pedido.total = total
+        .returning(
+            Pedido.id, Pedido.mesa_id, Pedido.mesero_id, Pedido.estado, Pedido.items_total,
+            select(models.Mesa.nombre).where(models.Mesa.id == Pedido.mesa_id).scalar_subquery().label("mesa_nombre"),
+        )
+        .execution_options(synchronize_session=False)
+    ).first()
+    if pedido is None:
+        actual = db.execute(select(Pedido.mesero_id).where(Pedido.id == pedido_id)).first()
+        if actual is None:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado.")
+        if mesero_id is not None and actual.mesero_id != mesero_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="El pedido es de otro mesero.")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El pedido ya está cerrado.")
+
+    insertados = _insertar_items(db, pedido_id, filas_items)
+    total = _total_pedido(db, pedido_id)
+    tareas = _tareas(insertados, productos, pedido_id, pedido.mesa_nombre)
+    bus.publicar(db, "items_agregados", {
+        "pedido_id": pedido_id,
+        "mesa_id": pedido.mesa_id,
+        "mesero_id": pedido.mesero_id,
+        "estado": pedido.estado.value,
+        "total": total,
+        "items": [
+            {"id": fila.id, "producto_id": fila.producto_id, "cantidad": fila.cantidad, "destino": fila.destino.value}
+            for fila in insertados
+        ],
+    }, topicos=_topicos_pedido(pedido.mesa_id, pedido.mesero_id, *{fila.destino.value for fila in insertados}))
+    # Con ítems sin servir la mesa vuelve a 'ocupada' (p. ej. estaba pendiente de pago).
+    # Se bloquea después del pedido, en el mismo orden que servir y cerrar
+    plano.ocupar_mesa(db, pedido.mesa_id)
+    plano.publicar_mesa(db, pedido.mesa_id)
+    respuesta = {
+        "pedido_id": pedido_id,
+        "estado": pedido.estado,
+        "total": total,
+        "items_total": pedido.items_total,
+        "items": _items_respuesta(insertados),
+    }
+    idempotencia.registrar(db, respuesta)
     db.commit()
-    db.refresh(db_pedido)
-    return db_pedido
+    cola_tareas.agregar(tareas)
+    return respuesta
 
-def get_tareas_pendientes(db: Session, destino: str):
-    """Devuelve ítems pendientes por destino ('cocina' o 'bar')."""
+def _leer_productos(db: Session, items: List[schemas.ItemPedidoCreate]) -> dict:
+    """Todos los productos referenciados en una sola consulta, por id; 400 si falta alguno."""
+    producto_ids = {item.producto_id for item in items}
+    productos = {}
+    if producto_ids:
+        productos = {
+            p.id: p for p in db.query(models.Producto).filter(models.Producto.id.in_(producto_ids))
+        }
+    for item in items:
+        if item.producto_id not in productos:
+            raise HTTPException(status_code=400, detail=f"Producto con id {item.producto_id} no encontrado.")
+    return productos
+
+def _filas_items(items: List[schemas.ItemPedidoCreate], productos: dict) -> List[dict]:
+    """Filas a insertar en items_pedido, con su destino y el precio vigente del producto."""
+    filas = []
+    for item in items:
+        producto = productos[item.producto_id]
+        filas.append({
+            "producto_id": item.producto_id,
+            "cantidad": item.cantidad,
+            "estado": models.EstadoItem.pendiente,
+            "destino": _destino_para(producto),
+            "precio_unitario": producto.precio or 0,
+        })
+    return filas
+
+def _insertar_items(db: Session, pedido_id: int, filas: List[dict]) -> list:
+    """Inserción de ítems en lote (un solo INSERT multi-fila) en la transacción en curso."""
+    if not filas:
+        return []
+    for fila in filas:
+        fila["pedido_id"] = pedido_id
+    return db.execute(
+        insert(models.ItemPedido).returning(
+            models.ItemPedido.id, models.ItemPedido.producto_id, models.ItemPedido.cantidad,
+            models.ItemPedido.destino
+        ),
+        filas
+    ).all()
+
+def _total_pedido(db: Session, pedido_id: int) -> float:
+    """Total ya actualizado por los triggers de items_pedido."""
+    return db.scalar(select(models.Pedido.total).where(models.Pedido.id == pedido_id))
+
+def _tareas(insertados: list, productos: dict, pedido_id: int, mesa_nombre: str) -> List[dict]:
+    """Ítems recién insertados en el formato de la cola de cocina/bar (TareaItem)."""
+    return [
+        {
+            "id": fila.id,
+            "cantidad": fila.cantidad,
+            "estado": models.EstadoItem.pendiente.value,
+            "destino": fila.destino.value,
+            "producto": producto_tarea(productos[fila.producto_id]),
+            "pedido": {"id": pedido_id, "mesa": {"nombre": mesa_nombre}},
+        }
+        for fila in insertados
+    ]
+
+def _items_respuesta(insertados: list) -> List[dict]:
+    return [
+        {"id": fila.id, "producto_id": fila.producto_id, "cantidad": fila.cantidad,
+         "estado": models.EstadoItem.pendiente, "destino": fila.destino}
+        for fila in insertados
+    ]
+
+def get_tareas_pendientes(db: Session, destino: str) -> bytes:
+    """
+    Devuelve el JSON de los ítems pendientes por destino ('cocina' o 'bar') desde la cola
+    en memoria. Sólo consulta la BD si la cola de ese destino aún no está cargada.
+    """
     if destino not in [d.value for d in models.DestinoItem]:
         raise HTTPException(status_code=400, detail="Destino inválido.")
-    return db.query(models.ItemPedido).filter(
+    tareas = cola_tareas.listar_json(destino)
+    if tareas is None:
+        reconciliar_cola_tareas(db, destino)
+        tareas = cola_tareas.listar_json(destino) or b"[]"
+    return tareas
+
+def reconciliar_cola_tareas(db: Session, destino: str | None = None):
+    """Recarga la cola en memoria desde la BD (un destino o todos) para corregir desviaciones."""
+    destinos = [destino] if destino else [d.value for d in models.DestinoItem]
+    for d in destinos:
+        desde = cola_tareas.marca()
+        items = _query_tareas_pendientes(db, d)
+        cola_tareas.reemplazar(d, [tarea_desde_item(item) for item in items], desde=desde)
+
+def _query_tareas_pendientes(db: Session, destino: str) -> List[models.ItemPedido]:
+    """
+    Ítems pendientes del destino con producto, pedido y mesa cargados en la misma consulta
+    (todas son relaciones muchos-a-uno), así serializarlos no dispara consultas por fila.
+    """
+    return db.query(models.ItemPedido).options(
+        joinedload(models.ItemPedido.producto),
+        joinedload(models.ItemPedido.pedido).joinedload(models.Pedido.mesa)
+    ).filter(
         models.ItemPedido.destino == destino,
         models.ItemPedido.estado == models.EstadoItem.pendiente
-    ).all()
+    ).order_by(models.ItemPedido.id).all()
+
+# Columnas que devuelven los UPDATE ... RETURNING (las que serializan las respuestas)
+COLUMNAS_ITEM = (
+    models.ItemPedido.id, models.ItemPedido.pedido_id, models.ItemPedido.producto_id,
+    models.ItemPedido.cantidad, models.ItemPedido.estado, models.ItemPedido.destino,
+)
+COLUMNAS_PEDIDO = (
+    models.Pedido.id, models.Pedido.mesa_id, models.Pedido.mesero_id, models.Pedido.estado,
+    models.Pedido.total, models.Pedido.fecha_creacion,
+)
 
-def marcar_item_listo(db: Session, item_id: int) -> models.ItemPedido:
-    item = db.query(models.ItemPedido).filter(models.ItemPedido.id == item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Ítem no encontrado.")
-    # sólo si está en preparación o pendiente
-    item.estado = models.EstadoItem.listo
+def _items_de(db: Session, pedido_id: int) -> List[dict]:
+    return [
+        dict(fila._mapping)
+        for fila in db.execute(
+            select(*COLUMNAS_ITEM).where(models.ItemPedido.pedido_id == pedido_id).order_by(models.ItemPedido.id)
+        )
+    ]
+
+def marcar_item_listo(db: Session, item_id: int, destino: Optional[str] = None) -> dict:
+    """
+    Pasa el ítem a 'listo' y avanza su pedido en la misma transacción: el contador
+    items_listos sube y, si era el último ítem, el pedido pasa a 'listo_para_servir'.
+    El UPDATE del pedido bloquea su fila, así dos ítems que terminan a la vez no se pisan.
+    Repetir la llamada (doble toque) devuelve el ítem sin volver a contar.
+    `destino` limita el ítem a una estación (cocina o bar); si no coincide es 403.
+    """
+    item, cambio = estados.transicionar(
+        db, models.ItemPedido, item_id, models.EstadoItem.listo, estados.TRANSICIONES_ITEM, COLUMNAS_ITEM,
+        condiciones=[models.ItemPedido.destino == destino] if destino else (),
+        no_encontrado="Ítem no encontrado.",
+    )
+    respuesta = dict(item._mapping)
+    if not cambio:
+        if idempotencia.registrar(db, respuesta):
+            db.commit()
+        return respuesta
+    pedido = _avanzar_pedido(db, item.pedido_id, 1)
+    bus.publicar(
+        db, "item_listo", {"item_id": item.id, "pedido_id": item.pedido_id, "destino": item.destino.value},
+        topicos=_topicos_pedido(pedido.mesa_id, pedido.mesero_id, item.destino.value)
+    )
+    _publicar_si_listo(db, pedido)
+    plano.publicar_mesa(db, pedido.mesa_id)
+    idempotencia.registrar(db, respuesta)
     db.commit()
-    db.refresh(item)
-    return item
+    cola_tareas.quitar(item.id, item.destino.value)
+    return respuesta
+
+# Tope de ítems por llamada a marcar_items_listos
+ITEMS_LOTE_MAX = 200
 
-def marcar_pedido_servido(db: Session, pedido_id: int) -> models.Pedido:
-    pedido = db.query(models.Pedido).filter(models.Pedido.id == pedido_id).first()
-    if not pedido:
+def marcar_items_listos(db: Session, destino: Optional[str] = None, item_ids: Optional[List[int]] = None,
+                        pedido_id: Optional[int] = None) -> dict:
+    """
+    Marca varios ítems como 'listo' con un solo UPDATE y un solo commit: los `item_ids`
+    indicados o todos los del pedido `pedido_id` (de `destino`, si se indica).
+    Devuelve los ítems que cambiaron y, para los ids pedidos que no, el motivo:
+    'no_encontrado', 'otro_destino' o 'ya_listo'.
+    """
+    if (item_ids is None) == (pedido_id is None):
+        raise HTTPException(status_code=400, detail="Indica item_ids o pedido_id (sólo uno).")
+    if item_ids is not None and len(item_ids) > ITEMS_LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {ITEMS_LOTE_MAX} ítems por llamada.")
+    condiciones = [
+        models.ItemPedido.id.in_(item_ids) if item_ids is not None else models.ItemPedido.pedido_id == pedido_id,
+        models.ItemPedido.estado.in_(estados.origenes(estados.TRANSICIONES_ITEM, models.EstadoItem.listo)),
+    ]
+    if destino:
+        condiciones.append(models.ItemPedido.destino == destino)
+    filas = sorted(db.execute(
+        update(models.ItemPedido)
+        .where(*condiciones)
+        .values(estado=models.EstadoItem.listo)
+        .returning(*COLUMNAS_ITEM)
+        .execution_options(synchronize_session=False)
+    ).all(), key=lambda f: f.id)
+
+    rechazados = []
+    cambiados = {f.id for f in filas}
+    faltantes = [i for i in dict.fromkeys(item_ids or ()) if i not in cambiados]
+    if faltantes:
+        actuales = {
+            f.id: f for f in db.execute(
+                select(models.ItemPedido.id, models.ItemPedido.destino).where(models.ItemPedido.id.in_(faltantes))
+            )
+        }
+        for item_id in faltantes:
+            actual = actuales.get(item_id)
+            if actual is None:
+                motivo = "no_encontrado"
+            elif destino and actual.destino.value != destino:
+                motivo = "otro_destino"
+            else:
+                motivo = "ya_listo"
+            rechazados.append({"id": item_id, "motivo": motivo})
+    elif pedido_id is not None and not filas and db.scalar(
+        select(models.Pedido.id).where(models.Pedido.id == pedido_id)
+    ) is None:
         raise HTTPException(status_code=404, detail="Pedido no encontrado.")
-    pedido.estado = models.EstadoPedido.servido
+
+    por_pedido = defaultdict(list)
+    for fila in filas:
+        por_pedido[fila.pedido_id].append(fila)
+    mesas = set()
+    # Los pedidos se actualizan siempre en el mismo orden (por id) para no bloquearse en cruz
+    for id_pedido in sorted(por_pedido):
+        items = por_pedido[id_pedido]
+        pedido = _avanzar_pedido(db, id_pedido, len(items))
+        bus.publicar(
+            db, "items_listos", {
+                "pedido_id": id_pedido,
+                "items": [{"item_id": f.id, "destino": f.destino.value} for f in items],
+            },
+            topicos=_topicos_pedido(pedido.mesa_id, pedido.mesero_id, *{f.destino.value for f in items})
+        )
+        _publicar_si_listo(db, pedido)
+        mesas.add(pedido.mesa_id)
+    for mesa_id in sorted(m for m in mesas if m is not None):
+        plano.publicar_mesa(db, mesa_id)
+    respuesta = {"actualizados": [dict(f._mapping) for f in filas], "rechazados": rechazados}
+    idempotencia.registrar(db, respuesta)
     db.commit()
-    db.refresh(pedido)
-    return pedido
+    for fila in filas:
+        cola_tareas.quitar(fila.id, fila.destino.value)
+    return respuesta
 
-def cerrar_pedido(db: Session, pedido_id: int) -> models.Pedido:
-    pedido = db.query(models.Pedido).filter(models.Pedido.id == pedido_id).first()
-    if not pedido:
-        raise HTTPException(status_code=404, detail="Pedido no encontrado.")
-    pedido.estado = models.EstadoPedido.cerrado
+def _avanzar_pedido(db: Session, pedido_id: int, listos: int):
+    """
+    Suma `listos` ítems terminados al pedido en un UPDATE (que bloquea su fila: ítems que
+    terminan a la vez no se pisan); devuelve el pedido actualizado.
+    """
+    return db.execute(
+        update(models.Pedido)
+        .where(models.Pedido.id == pedido_id)
+        .values(items_listos=models.Pedido.items_listos + listos, estado=estados.estado_tras_items_listos(listos))
+        .returning(models.Pedido.id, models.Pedido.mesa_id, models.Pedido.mesero_id, models.Pedido.estado,
+                   models.Pedido.items_listos, models.Pedido.items_total)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+def _publicar_si_listo(db: Session, pedido):
+    """Avisa 'pedido_listo' si con los últimos ítems el pedido quedó completo."""
+    if pedido.estado == models.EstadoPedido.listo_para_servir and pedido.items_listos == pedido.items_total:
+        bus.publicar(
+            db, "pedido_listo", {"pedido_id": pedido.id, "mesa_id": pedido.mesa_id, "mesero_id": pedido.mesero_id},
+            topicos=_topicos_pedido(pedido.mesa_id, pedido.mesero_id)
+        )
+
+def _cambiar_estado_pedido(db: Session, pedido_id: int, destino: models.EstadoPedido, tipo_evento: str,
+                           al_cambiar=None) -> dict:
+    """
+    Transición del pedido (un UPDATE condicional); si hubo cambio se recalcula el estado de
+    su mesa y se publica el evento.
+    """
+    pedido, cambio = estados.transicionar(
+        db, models.Pedido, pedido_id, destino, estados.TRANSICIONES_PEDIDO, COLUMNAS_PEDIDO,
+        no_encontrado="Pedido no encontrado.",
+    )
+    if cambio:
+        if al_cambiar is not None:
+            al_cambiar(db, pedido)
+        bus.publicar(
+            db, tipo_evento, {"pedido_id": pedido.id, "mesa_id": pedido.mesa_id, "mesero_id": pedido.mesero_id},
+            topicos=_topicos_pedido(pedido.mesa_id, pedido.mesero_id)
+        )
+        plano.sincronizar_mesa(db, pedido.mesa_id)
+    respuesta = {**pedido._mapping, "items": _items_de(db, pedido.id)}
+    idempotencia.registrar(db, respuesta)
     db.commit()
-    db.refresh(pedido)
-    return pedido
+    return respuesta
+
+def marcar_pedido_servido(db: Session, pedido_id: int) -> dict:
+    return _cambiar_estado_pedido(db, pedido_id, models.EstadoPedido.servido, "pedido_servido")
+
+def cerrar_pedido(db: Session, pedido_id: int) -> dict:
+    # Las ventas se suman en la misma transacción, y una sola vez: un segundo cierre no cambia nada
+    return _cambiar_estado_pedido(db, pedido_id, models.EstadoPedido.cerrado, "pedido_cerrado",
+                                  al_cambiar=acumular_pedido_cerrado)
+
+# Historial de pedidos
+def consulta_historial_pedidos(
+    cursor: Optional[str] = None,
+    mesero_id: Optional[int] = None,
+    mesa_id: Optional[int] = None,
+    estado: Optional[models.EstadoPedido] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+) -> Select:
+    """
+    Pedidos del más reciente al más antiguo, paginados por (fecha_creacion, id) sobre
+    ix_pedidos_fecha_id / ix_pedidos_mesero_fecha_id. Los ítems se cargan con selectinload:
+    una consulta extra por página (o por lote en NDJSON), no una por pedido.
+    """
+    consulta = select(models.Pedido).options(selectinload(models.Pedido.items))
+    if mesero_id is not None:
+        consulta = consulta.where(models.Pedido.mesero_id == mesero_id)
+    if mesa_id is not None:
+        consulta = consulta.where(models.Pedido.mesa_id == mesa_id)
+    if estado is not None:
+        consulta = consulta.where(models.Pedido.estado == estado)
+    if desde is not None:
+        consulta = consulta.where(models.Pedido.fecha_creacion >= desde)
+    if hasta is not None:
+        consulta = consulta.where(models.Pedido.fecha_creacion < hasta)
+    return aplicar_keyset(
+        consulta, [models.Pedido.fecha_creacion, models.Pedido.id], cursor, [datetime, int], descendente=True
+    )
+
+def get_historial_pedidos(db: Session, limit: int, **filtros) -> Tuple[List[models.Pedido], Optional[str]]:
+    """Una página del historial y el cursor de la siguiente (None si es la última)."""
+    pedidos = db.scalars(consulta_historial_pedidos(**filtros).limit(limit + 1)).all()
+    return cortar_pagina(pedidos, limit, lambda p: (p.fecha_creacion, p.id))
+
+# === VARIANTES ASYNC ===
+# Las rutas async reciben una AsyncSession. Para no duplicar la lógica, cada variante corre
+# la función sync con AsyncSession.run_sync: el código ORM se ejecuta en un greenlet sobre
+# el driver async, sin ocupar un hilo mientras espera a la BD. Las funciones sync dejan
+# cargado todo lo que la respuesta serializa (fuera de la sesión no hay carga perezosa).
+def _variante_async(fn):
+    async def variante(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    variante.__name__ = f"{fn.__name__}_async"
+    variante.__doc__ = fn.__doc__
+    return variante
+
+get_catalogo_async = _variante_async(get_catalogo)
+create_producto_async = _variante_async(create_producto)
+get_user_by_name_async = _variante_async(get_user_by_name)
+create_pedido_async = _variante_async(create_pedido)
+agregar_items_async = _variante_async(agregar_items)
+get_tareas_pendientes_async = _variante_async(get_tareas_pendientes)
+reconciliar_cola_tareas_async = _variante_async(reconciliar_cola_tareas)
+marcar_item_listo_async = _variante_async(marcar_item_listo)
+marcar_items_listos_async = _variante_async(marcar_items_listos)
+marcar_pedido_servido_async = _variante_async(marcar_pedido_servido)
+cerrar_pedido_async = _variante_async(cerrar_pedido)
+get_historial_pedidos_async = _variante_async(get_historial_pedidos)
+get_plano_async = _variante_async(plano.get_plano)
@@ -0,0 +1,121 @@
+# app/dinero.py
+"""
+Montos en unidades menores (centavos) enteras.
+En la BD los precios y totales son BIGINT en centavos (columnas *_centavos): sumarlos no
+acumula errores de redondeo. En Python y en la API se siguen viendo en unidades (10.5):
+el tipo `Dinero` convierte al escribir y al leer, así que crud, schemas y la API no cambian.
+
+El total de cada pedido lo mantiene la BD: triggers sobre items_pedido suman (o restan)
+cantidad * precio_unitario_centavos en pedidos.total_centavos al insertar, modificar o borrar
+ítems. El precio unitario se copia en cada ítem al pedirlo; cambiar el menú después no
+altera los pedidos ya tomados.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import DDL, BigInteger, Table, event
+from sqlalchemy.types import TypeDecorator
+
+CENTAVOS_POR_UNIDAD = 100
+
+
+def a_centavos(valor: Union[int, float, Decimal, str]) -> int:
+    """10.5 -> 1050. Los float se toman por su representación decimal (0.1 es 10, no 10.000…01)."""
+    decimal = valor if isinstance(valor, Decimal) else Decimal(str(valor))
+    return int((decimal * CENTAVOS_POR_UNIDAD).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def a_unidades(centavos: Union[int, Decimal]) -> float:
+    """1050 -> 10.5 (Postgres devuelve SUM(bigint) como Decimal)."""
+    return int(centavos) / CENTAVOS_POR_UNIDAD
+
+
+class Dinero(TypeDecorator):
+    """BIGINT de centavos en la BD; unidades (float) en Python."""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect) -> Optional[int]:
+        return None if value is None else a_centavos(value)
+
+    def process_result_value(self, value, dialect) -> Optional[float]:
+        return None if value is None else a_unidades(value)
+
+
+# === TOTAL DEL PEDIDO MANTENIDO POR LA BD ===
+# En Postgres, las inserciones (el caso frecuente, en lote) usan un trigger por sentencia con
+# tabla de transición: un UPDATE por pedido aunque el INSERT traiga muchos ítems. Las
+# modificaciones y borrados son raros y van fila por fila (Postgres no admite tablas de
+# transición en triggers con lista de columnas).
+DDL_TOTAL_PEDIDO: Dict[str, List[str]] = {
+    "postgresql": [
+        """
+        CREATE OR REPLACE FUNCTION items_pedido_total_insertar() RETURNS trigger AS $$
+        BEGIN
+            UPDATE pedidos SET total_centavos = pedidos.total_centavos + nuevos.suma
+            FROM (
+                SELECT pedido_id, SUM(COALESCE(cantidad, 0) * precio_unitario_centavos) AS suma
+                FROM items_nuevos GROUP BY pedido_id
+            ) AS nuevos
+            WHERE pedidos.id = nuevos.pedido_id;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_insertar AFTER INSERT ON items_pedido
+        REFERENCING NEW TABLE AS items_nuevos
+        FOR EACH STATEMENT EXECUTE FUNCTION items_pedido_total_insertar()
+        """,
+        """
+        CREATE OR REPLACE FUNCTION items_pedido_total_cambiar() RETURNS trigger AS $$
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos - COALESCE(OLD.cantidad, 0) * OLD.precio_unitario_centavos
+            WHERE id = OLD.pedido_id;
+            IF TG_OP = 'UPDATE' THEN
+                UPDATE pedidos SET total_centavos = total_centavos + COALESCE(NEW.cantidad, 0) * NEW.precio_unitario_centavos
+                WHERE id = NEW.pedido_id;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_cambiar
+        AFTER DELETE OR UPDATE OF cantidad, precio_unitario_centavos, pedido_id ON items_pedido
+        FOR EACH ROW EXECUTE FUNCTION items_pedido_total_cambiar()
+        """,
+    ],
+    "sqlite": [
+        """
+        CREATE TRIGGER items_pedido_total_insertar AFTER INSERT ON items_pedido
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos + COALESCE(NEW.cantidad, 0) * NEW.precio_unitario_centavos
+            WHERE id = NEW.pedido_id;
+        END
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_modificar AFTER UPDATE OF cantidad, precio_unitario_centavos, pedido_id
+        ON items_pedido
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos - COALESCE(OLD.cantidad, 0) * OLD.precio_unitario_centavos
+            WHERE id = OLD.pedido_id;
+            UPDATE pedidos SET total_centavos = total_centavos + COALESCE(NEW.cantidad, 0) * NEW.precio_unitario_centavos
+            WHERE id = NEW.pedido_id;
+        END
+        """,
+        """
+        CREATE TRIGGER items_pedido_total_borrar AFTER DELETE ON items_pedido
+        BEGIN
+            UPDATE pedidos SET total_centavos = total_centavos - COALESCE(OLD.cantidad, 0) * OLD.precio_unitario_centavos
+            WHERE id = OLD.pedido_id;
+        END
+        """,
+    ],
+}
+
+
+def instalar_total_pedido(items_pedido: Table):
+    """Crea los triggers junto con la tabla cuando el esquema sale de create_all (dev, bench)."""
+    for dialecto, sentencias in DDL_TOTAL_PEDIDO.items():
+        for sentencia in sentencias:
+            event.listen(items_pedido, "after_create", DDL(sentencia).execute_if(dialect=dialecto))
@@ -0,0 +1,96 @@
+# app/esquema.py
+"""
+Esquema de la BD: migraciones de Alembic y verificación de que la BD está en la última
+revisión. gunicorn.conf.py lo usa al arrancar, una sola vez en el proceso maestro y antes
+de crear los workers; también se puede usar a mano:
+
+    python -m app.esquema             # revisión actual vs. la última (código 1 si difieren)
+    python -m app.esquema --migrar    # alembic upgrade head
+"""
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from .database import SQLALCHEMY_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+class EsquemaDesactualizado(RuntimeError):
+    pass
+
+
+def config_alembic() -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # La misma BD que la app (DATABASE_URL o su valor por defecto); % se escapa por el .ini
+    config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL.replace("%", "%%"))
+    # Dentro de gunicorn no se reconfigura el logging con la sección del alembic.ini
+    config.attributes["configurar_logging"] = False
+    return config
+
+
+def revision_head(config: Optional[Config] = None) -> str:
+    return ScriptDirectory.from_config(config or config_alembic()).get_current_head()
+
+
+def revision_actual() -> Optional[str]:
+    """Revisión registrada en alembic_version (None si la BD nunca se migró)."""
+    # Conexión propia y sin pool: en el maestro de gunicorn no debe quedar ninguna abierta
+    # que los workers hereden al hacer fork
+    motor = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+    try:
+        with motor.connect() as conexion:
+            return MigrationContext.configure(conexion).get_current_revision()
+    finally:
+        motor.dispose()
+
+
+def verificar_esquema() -> str:
+    """Una consulta: la BD debe estar en la última revisión. Devuelve esa revisión."""
+    config = config_alembic()
+    head, actual = revision_head(config), revision_actual()
+    if actual == head:
+        return head
+    if actual is None:
+        detalle = "la BD no tiene revisión de Alembic"
+    elif ScriptDirectory.from_config(config).get_revision(actual) is None:
+        detalle = f"la BD está en {actual}, que este código no conoce (¿la migró un despliegue más nuevo?)"
+    else:
+        detalle = f"la BD está en {actual}"
+    raise EsquemaDesactualizado(f"Esquema desactualizado: {detalle}, la última es {head}. Ejecutar alembic upgrade head.")
+
+
+def migrar() -> str:
+    """alembic upgrade head (en Postgres, serializado con un advisory lock; ver alembic/env.py)."""
+    config = config_alembic()
+    command.upgrade(config, "head")
+    return revision_head(config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Revisa o migra el esquema de la BD.")
+    parser.add_argument("--migrar", action="store_true", help="aplica las migraciones pendientes")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.migrar:
+        print(f"Esquema en {migrar()}")
+        return
+    try:
+        print(f"Esquema al día en {verificar_esquema()}")
+    except EsquemaDesactualizado as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# app/estados.py
+"""
+Máquina de estados de ítems y pedidos.
+Cada cambio de estado es un único UPDATE condicional (compare-and-set):
+    UPDATE ... SET estado = :destino WHERE id = :id AND estado IN (:origenes válidos) RETURNING ...
+Si dos peticiones compiten (el doble toque en la pantalla de cocina), sólo una cambia la
+fila; la otra no encuentra un estado de origen válido y ve el estado ya aplicado.
+"""
+
+from typing import Any, Dict, Iterable, Sequence, Set, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row, and_, case, literal, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+EstadoItem = models.EstadoItem
+EstadoPedido = models.EstadoPedido
+
+TRANSICIONES_ITEM: Dict[EstadoItem, Set[EstadoItem]] = {
+    EstadoItem.pendiente: {EstadoItem.en_preparacion, EstadoItem.listo},
+    EstadoItem.en_preparacion: {EstadoItem.listo},
+    EstadoItem.listo: set(),
+}
+
+# El mesero puede servir lo que ya salió antes de que el pedido esté completo; nada
+# vuelve atrás (salvo al agregar ítems, ver estado_tras_agregar_items) y un pedido
+# cerrado no cambia más.
+TRANSICIONES_PEDIDO: Dict[EstadoPedido, Set[EstadoPedido]] = {
+    EstadoPedido.nuevo: {EstadoPedido.en_preparacion, EstadoPedido.listo_para_servir,
+                         EstadoPedido.servido, EstadoPedido.cerrado},
+    EstadoPedido.en_preparacion: {EstadoPedido.listo_para_servir, EstadoPedido.servido, EstadoPedido.cerrado},
+    EstadoPedido.listo_para_servir: {EstadoPedido.servido, EstadoPedido.cerrado},
+    EstadoPedido.servido: {EstadoPedido.cerrado},
+    EstadoPedido.cerrado: set(),
+}
+
+
+def origenes(transiciones: Dict[Any, Set[Any]], destino) -> list:
+    """Estados desde los que se puede llegar a `destino`."""
+    return [estado for estado, siguientes in transiciones.items() if destino in siguientes]
+
+
+def transicionar(
+    db: Session,
+    modelo,
+    id: int,
+    destino,
+    transiciones: Dict[Any, Set[Any]],
+    columnas: Sequence,
+    condiciones: Iterable = (),
+    no_encontrado: str = "Registro no encontrado.",
+    **valores,
+) -> Tuple[Row, bool]:
+    """
+    Aplica la transición a `destino` con un UPDATE ... RETURNING `columnas` y devuelve
+    (fila, True). Si la fila ya estaba en `destino` devuelve (fila actual, False), sin error:
+    repetir la acción es inocuo. 404 si no existe y 409 si la transición no es válida.
+    `condiciones` restringe la fila (p. ej. el destino del ítem); si no se cumplen es 403.
+    """
+    condiciones = list(condiciones)
+    fila = db.execute(
+        update(modelo)
+        .where(modelo.id == id, modelo.estado.in_(origenes(transiciones, destino)), *condiciones)
+        .values(estado=destino, **valores)
+        .returning(*columnas)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if fila is not None:
+        return fila, True
+
+    # Camino lento (sólo cuando no hubo cambio): averiguar por qué
+    actual = db.execute(select(*columnas).where(modelo.id == id)).first()
+    if actual is None:
+        raise HTTPException(status_code=404, detail=no_encontrado)
+    if condiciones and db.scalar(select(modelo.id).where(modelo.id == id, *condiciones)) is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes permiso sobre este registro.")
+    if actual.estado == destino:
+        return actual, False
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Transición inválida: {actual.estado.value} -> {destino.value}.",
+    )
+
+
+def estado_tras_items_listos(cantidad: int = 1):
+    """
+    Expresión SET del estado del pedido cuando `cantidad` de sus ítems pasan a 'listo' (el
+    UPDATE suma `cantidad` a items_listos; aquí se leen los valores previos): al completar
+    todos pasa a 'listo_para_servir'; antes, de 'nuevo' a 'en_preparacion'. Un pedido ya
+    servido o cerrado conserva su estado.
+    """
+    pedido = models.Pedido
+    tipo = pedido.estado.type
+    return case(
+        (and_(pedido.estado.in_(origenes(TRANSICIONES_PEDIDO, EstadoPedido.listo_para_servir)),
+              pedido.items_listos + cantidad >= pedido.items_total),
+         literal(EstadoPedido.listo_para_servir, tipo)),
+        (pedido.estado == EstadoPedido.nuevo, literal(EstadoPedido.en_preparacion, tipo)),
+        else_=pedido.estado,
+    )
+
+
+def estado_tras_agregar_items():
+    """
+    Expresión SET del estado del pedido al agregarle ítems: uno que estaba completo
+    ('listo_para_servir' o 'servido') vuelve a 'en_preparacion', porque los nuevos ítems
+    todavía no salen. 'nuevo' y 'en_preparacion' no cambian.
+    """
+    pedido = models.Pedido
+    return case(
+        (pedido.estado.in_([EstadoPedido.listo_para_servir, EstadoPedido.servido]),
+         literal(EstadoPedido.en_preparacion, pedido.estado.type)),
+        else_=pedido.estado,
+    )
@@ -0,0 +1,265 @@
+# app/eventos.py
+"""
+Bus de eventos entre workers.
+gunicorn levanta varios workers y cada uno tiene sus propios WebSockets y cachés en memoria;
+los eventos de dominio (pedido creado, ítem listo, catálogo actualizado...) se publican aquí
+y cada worker los recibe para avisar a sus propios sockets e invalidar sus cachés.
+
+- BusPostgres: LISTEN/NOTIFY. El NOTIFY se emite dentro de la transacción de la sesión,
+  así Postgres sólo lo entrega si el commit ocurre.
+- BusLocal: mismo contrato dentro del proceso (un solo worker, SQLite, pruebas); los
+  eventos se despachan tras el commit de la sesión que los publicó.
+
+Los eventos con tópicos (los que van a los WebSockets) además quedan en la tabla `eventos`
+con un `seq` creciente, escritos en la misma transacción con un solo INSERT justo antes del
+commit. Un WebSocket que se reconecta con ?last_seq=N recibe sólo lo que se perdió
+(`leer_desde`); si quedó demasiado atrás se le pide recargar (RESINCRONIZAR).
+La entrega es "al menos una vez": el cliente descarta los seq que ya vio.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, func, insert, or_, select, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+CANAL = "restaurante_eventos"
+# 'auto' usa Postgres si la BD es Postgres; 'local' fuerza el bus en proceso
+EVENTOS_BUS = os.environ.get("EVENTOS_BUS", "auto")
+# Postgres rechaza payloads de NOTIFY de 8000 bytes o más
+MAX_PAYLOAD = 7900
+# Identifica a este worker; permite distinguir eventos propios de los de otros workers.
+# Con preload_app los workers nacen de un fork del maestro: cada uno genera el suyo.
+ORIGEN = uuid.uuid4().hex
+
+
+def _nuevo_origen():
+    global ORIGEN
+    ORIGEN = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=_nuevo_origen)
+# Antigüedad de los eventos que se conservan para reenviar
+EVENTOS_RETENCION_HORAS = float(os.environ.get("EVENTOS_RETENCION_HORAS", "24"))
+# Con más eventos perdidos que esto, recargar sale más barato que reenviarlos
+EVENTOS_REENVIO_MAX = int(os.environ.get("EVENTOS_REENVIO_MAX", "1000"))
+# Un evento con seq menor puede confirmarse después de uno mayor (transacciones en
+# paralelo): se reenvían también los de estos últimos segundos aunque su seq sea <= last_seq
+EVENTOS_RELECTURA_SEG = float(os.environ.get("EVENTOS_RELECTURA_SEG", "2"))
+
+Manejador = Callable[[dict], object]
+
+
+class Bus:
+    def __init__(self):
+        self._manejadores: List[Manejador] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def suscribir(self, manejador: Manejador):
+        """Registra un manejador (sync o async) que recibe cada evento como dict."""
+        self._manejadores.append(manejador)
+
+    def publicar(self, db: Session, tipo: str, datos: dict, topicos: Iterable[str] = ()):
+        """
+        Publica un evento ligado a la transacción de `db`; se entrega sólo si hay commit.
+        `topicos` indica qué WebSockets deben recibirlo (ver websocket_manager); sin tópicos
+        el evento sólo sirve para mantener las cachés de los workers y no se registra.
+        """
+        db.info.setdefault("eventos_pendientes", []).append(self._evento(tipo, datos, topicos))
+
+    def _preparar(self, db: Session, eventos: List[dict]):
+        """Antes del commit: registra los eventos con tópicos y les asigna su seq."""
+        registrables = [e for e in eventos if e["topicos"]]
+        if not registrables:
+            return
+        ahora = datetime.utcnow()
+        # En Postgres es un solo INSERT (el seq autoincremental ordena el RETURNING); SQLite
+        # no garantiza ese orden y lo hace fila por fila
+        seqs = db.execute(
+            insert(models.Evento).returning(models.Evento.seq, sort_by_parameter_order=True),
+            [
+                {"tipo": e["tipo"], "topicos": json.dumps(e["topicos"]), "datos": json.dumps(e["datos"]),
+                 "creado_en": ahora}
+                for e in registrables
+            ],
+        ).scalars().all()
+        for evento, seq in zip(registrables, seqs):
+            evento["seq"] = seq
+
+    async def iniciar(self):
+        self._loop = asyncio.get_running_loop()
+
+    async def detener(self):
+        self._loop = None
+
+    def _evento(self, tipo: str, datos: dict, topicos: Iterable[str] = ()) -> dict:
+        return {"tipo": tipo, "origen": ORIGEN, "topicos": sorted(set(topicos)), "datos": datos}
+
+    def _emitir(self, evento: dict):
+        """Entrega el evento a los manejadores en el event loop (desde cualquier hilo)."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._despachar, evento)
+        else:
+            self._despachar(evento)
+
+    def _despachar(self, evento: dict):
+        for manejador in self._manejadores:
+            try:
+                resultado = manejador(evento)
+                if asyncio.iscoroutine(resultado):
+                    if self._loop is not None:
+                        self._loop.create_task(resultado)
+                    else:
+                        resultado.close()
+            except Exception:
+                logger.exception("Error en manejador de eventos (%s)", evento.get("tipo"))
+
+
+class BusLocal(Bus):
+    pass
+
+
+class BusPostgres(Bus):
+    def __init__(self, url: str):
+        super().__init__()
+        self._url = url
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def _preparar(self, db: Session, eventos: List[dict]):
+        super()._preparar(db, eventos)
+        for evento in eventos:
+            payload = json.dumps(evento)
+            if len(payload.encode()) > MAX_PAYLOAD:
+                # Se conservan sólo los datos escalares (ids); los receptores recargan lo demás
+                escalares = {k: v for k, v in evento["datos"].items() if isinstance(v, (int, float, str, bool))}
+                payload = json.dumps({**evento, "datos": {**escalares, "truncado": True}})
+            db.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": CANAL, "payload": payload})
+        # Postgres entrega los NOTIFY con el commit; no queda nada para after_commit
+        eventos.clear()
+
+    async def iniciar(self):
+        await super().iniciar()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._escuchar, name="eventos-listen", daemon=True)
+        self._hilo.start()
+
+    async def detener(self):
+        self._detener.set()
+        await super().detener()
+
+    def _escuchar(self):
+        """Hilo dedicado con una conexión propia en LISTEN; reintenta si se corta."""
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        espera = 1.0
+        while not self._detener.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self._url)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {CANAL}")
+                espera = 1.0
+                # Mientras no hubo LISTEN se pudieron perder eventos: las cachés se rehacen
+                self._emitir(self._evento("resincronizar", {}))
+                while not self._detener.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notificacion = conn.notifies.pop(0)
+                        self._emitir(json.loads(notificacion.payload))
+            except Exception as e:
+                logger.warning("LISTEN %s interrumpido: %s; reintento en %.0fs", CANAL, e, espera)
+                self._detener.wait(espera)
+                espera = min(espera * 2, 30.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def crear_bus() -> Bus:
+    if EVENTOS_BUS == "local" or engine.dialect.name != "postgresql":
+        return BusLocal()
+    url = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    return BusPostgres(url)
+
+
+bus = crear_bus()
+
+
+def ultimo_seq(db: Session) -> int:
+    """Seq del último evento registrado (0 si no hay ninguno)."""
+    return db.scalar(select(func.max(models.Evento.seq))) or 0
+
+
+def leer_desde(db: Session, last_seq: int, topicos: Optional[Set[str]]) -> Tuple[Optional[List[dict]], int]:
+    """
+    Eventos registrados después de `last_seq` (más los de los últimos EVENTOS_RELECTURA_SEG)
+    para alguno de `topicos` (None: todos), en orden de seq, y el último seq conocido.
+    Devuelve None en vez de la lista si el cliente quedó demasiado atrás (los eventos que
+    le faltan ya se purgaron o son más de EVENTOS_REENVIO_MAX) o su seq no es de esta BD.
+    """
+    primero, ultimo = db.execute(select(func.min(models.Evento.seq), func.max(models.Evento.seq))).one()
+    if primero is None:
+        return ([] if last_seq <= 0 else None), max(last_seq, 0)
+    if last_seq < primero - 1 or last_seq > ultimo:
+        return None, ultimo
+    consulta = select(models.Evento.seq, models.Evento.tipo, models.Evento.datos).where(or_(
+        models.Evento.seq > last_seq,
+        models.Evento.creado_en >= datetime.utcnow() - timedelta(seconds=EVENTOS_RELECTURA_SEG),
+    ))
+    if topicos is not None:
+        # Se filtra en la BD: el tope cuenta sólo los eventos del cliente, no los de otros
+        # tópicos. `topicos` es la lista en JSON ('["mesa:3", "mesero:7"]')
+        consulta = consulta.where(or_(
+            *(models.Evento.topicos.contains(json.dumps(t), autoescape=True) for t in sorted(topicos))
+        ))
+    filas = db.execute(consulta.order_by(models.Evento.seq).limit(EVENTOS_REENVIO_MAX + 1)).all()
+    if len(filas) > EVENTOS_REENVIO_MAX:
+        return None, ultimo
+    return [{"seq": f.seq, "tipo": f.tipo, "datos": json.loads(f.datos)} for f in filas], ultimo
+
+
+def purgar(db: Session) -> int:
+    """Borra los eventos más viejos que EVENTOS_RETENCION_HORAS."""
+    limite = datetime.utcnow() - timedelta(hours=EVENTOS_RETENCION_HORAS)
+    borrados = db.execute(delete(models.Evento).where(models.Evento.creado_en < limite)).rowcount
+    db.commit()
+    return borrados
+
+
+@event.listens_for(Session, "before_commit")
+def _preparar_eventos(session):
+    # El commit hace su flush después de este listener: sin este flush, los eventos que se
+    # publican al hacer flush (usuario_modificado, ver principales) no llegarían a registrarse
+    session.flush()
+    eventos = session.info.get("eventos_pendientes")
+    if eventos:
+        bus._preparar(session, eventos)
+
+
+# El bus local entrega en el commit y descarta en el rollback
+@event.listens_for(Session, "after_commit")
+def _entregar_eventos_locales(session):
+    for evento in session.info.pop("eventos_pendientes", ()):
+        bus._emitir(evento)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_eventos_locales(session):
+    session.info.pop("eventos_pendientes", None)
@@ -0,0 +1,167 @@
+# app/idempotencia.py
+"""
+Claves de idempotencia (cabecera Idempotency-Key) para crear pedidos y cambiar estados.
+Las tablets reintentan cuando el Wi-Fi falla; con la misma clave el reintento recibe la
+respuesta guardada sin volver a tocar pedidos ni ítems.
+
+1. Se reserva la clave (fila sin respuesta) en una transacción corta.
+2. El intento bloquea la fila (SELECT ... FOR UPDATE) y crud hace el trabajo en esa misma
+   transacción; antes de su commit llama a `registrar` con la respuesta: pedido y
+   respuesta se confirman juntos, nunca uno sin el otro, y el bloqueo dura hasta entonces.
+3. Si el trabajo falla, la reserva se libera y el reintento vuelve a ejecutar.
+Una reserva sin respuesta queda de un intento que murió sin llegar al paso 3 (el proceso
+se cayó). Otro intento la toma sólo si puede bloquear la fila (FOR UPDATE SKIP LOCKED):
+mientras el primero siga corriendo la tiene bloqueada y el reintento recibe 409, dure lo
+que dure. Además la reserva debe tener más de IDEMPOTENCIA_EN_PROCESO_SEG, lo que cubre
+el instante entre el commit del paso 1 y el bloqueo del paso 2.
+SQLite no tiene bloqueos de fila: ahí sólo rige IDEMPOTENCIA_EN_PROCESO_SEG, y un intento
+que tarde más que eso puede duplicarse. Es para desarrollo y pruebas con un solo worker.
+"""
+
+import enum
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Optional
+
+from fastapi import Header, HTTPException, Request, status
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+IDEMPOTENCIA_TTL_HORAS = float(os.environ.get("IDEMPOTENCIA_TTL_HORAS", "24"))
+IDEMPOTENCIA_EN_PROCESO_SEG = float(os.environ.get("IDEMPOTENCIA_EN_PROCESO_SEG", "30"))
+CLAVE_MAX = 255
+
+Clave = models.ClaveIdempotencia
+
+
+@dataclass(frozen=True)
+class Idempotencia:
+    """Clave recibida (o None) y la ruta a la que se aplica."""
+    clave: Optional[str]
+    ruta: str
+
+
+def idempotencia_de(request: Request, idempotency_key: Optional[str] = Header(None)) -> Idempotencia:
+    """Dependencia de FastAPI: lee la cabecera Idempotency-Key."""
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= CLAVE_MAX:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key debe tener entre 1 y {CLAVE_MAX} caracteres.")
+    return Idempotencia(idempotency_key, f"{request.method} {request.url.path}")
+
+
+def _a_json(valor):
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def _huella(ruta: str, cuerpo: Any) -> str:
+    return hashlib.sha256(json.dumps([ruta, cuerpo], sort_keys=True, default=_a_json).encode()).hexdigest()
+
+
+async def ejecutar(db: AsyncSession, idem: Idempotencia, usuario_id: int, fn: Callable, cuerpo: Any = None, **kwargs):
+    """Ejecuta la función crud `fn(db, **kwargs)` respetando la clave, si vino una."""
+    if idem.clave is None:
+        return await db.run_sync(fn, **kwargs)
+    return await db.run_sync(_ejecutar, idem, usuario_id, _huella(idem.ruta, cuerpo), fn, kwargs)
+
+
+def _ejecutar(db: Session, idem: Idempotencia, usuario_id: int, huella: str, fn: Callable, kwargs: dict):
+    guardada = _reservar(db, idem, usuario_id, huella)
+    if guardada is not None:
+        return guardada
+    db.info["idempotencia"] = (usuario_id, idem.clave)
+    try:
+        return fn(db, **kwargs)
+    except BaseException:
+        db.rollback()
+        db.execute(delete(Clave).where(
+            Clave.usuario_id == usuario_id, Clave.clave == idem.clave, Clave.respuesta.is_(None)
+        ))
+        db.commit()
+        raise
+    finally:
+        db.info.pop("idempotencia", None)
+
+
+def _fila(usuario_id: int, clave: str):
+    return select(Clave.usuario_id).where(Clave.usuario_id == usuario_id, Clave.clave == clave)
+
+
+def _reservar(db: Session, idem: Idempotencia, usuario_id: int, huella: str):
+    """None si esta petición debe ejecutarse; la respuesta guardada si es un reintento."""
+    ahora = datetime.utcnow()
+    try:
+        db.execute(insert(Clave).values(
+            usuario_id=usuario_id, clave=idem.clave, ruta=idem.ruta, huella=huella, creada_en=ahora
+        ))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+    else:
+        # Abre la transacción del trabajo con la fila bloqueada (se suelta con el commit de crud)
+        db.execute(_fila(usuario_id, idem.clave).with_for_update())
+        return None
+
+    fila = db.execute(
+        select(Clave.ruta, Clave.huella, Clave.respuesta).where(Clave.usuario_id == usuario_id, Clave.clave == idem.clave)
+    ).first()
+    if fila is not None and (fila.ruta != idem.ruta or fila.huella != huella):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Esta Idempotency-Key ya se usó con otra petición."
+        )
+    if fila is not None and fila.respuesta is not None:
+        return json.loads(fila.respuesta)
+    # Si el intento que la reservó sigue en curso tiene la fila bloqueada y no se toma
+    tomada = fila is not None and db.execute(
+        _fila(usuario_id, idem.clave)
+        .where(Clave.respuesta.is_(None),
+               Clave.creada_en < ahora - timedelta(seconds=IDEMPOTENCIA_EN_PROCESO_SEG))
+        .with_for_update(skip_locked=True)
+    ).first() is not None
+    if tomada:
+        # Sin commit: este intento conserva el bloqueo durante su trabajo
+        db.execute(
+            update(Clave).where(Clave.usuario_id == usuario_id, Clave.clave == idem.clave).values(creada_en=ahora)
+        )
+        return None
+    db.rollback()
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Hay una petición con esta Idempotency-Key en curso.",
+        headers={"Retry-After": "1"},
+    )
+
+
+def registrar(db: Session, respuesta: Any) -> bool:
+    """
+    Guarda la respuesta de la clave en curso en la transacción de `db` (crud la llama justo
+    antes de su commit). No hace nada si la petición no trae clave; devuelve si guardó.
+    """
+    clave = db.info.get("idempotencia")
+    if clave is None:
+        return False
+    usuario_id, valor = clave
+    db.execute(
+        update(Clave)
+        .where(Clave.usuario_id == usuario_id, Clave.clave == valor)
+        .values(respuesta=json.dumps(respuesta, default=_a_json))
+    )
+    return True
+
+
+def purgar(db: Session) -> int:
+    """Borra las claves vencidas (más viejas que IDEMPOTENCIA_TTL_HORAS)."""
+    limite = datetime.utcnow() - timedelta(hours=IDEMPOTENCIA_TTL_HORAS)
+    borradas = db.execute(delete(Clave).where(Clave.creada_en < limite)).rowcount
+    db.commit()
+    return borradas
@@ -5,177 +5,372 @@ Se corrigieron: sintaxis errónea en marcar_item_como_listo, uso consistente de
 y pequeños ajustes para evitar await sobre funciones sync.
 """
 
-from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, status, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.staticfiles import StaticFiles
-from typing import List
-from .websocket_manager import manager
-import json
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+from .websocket_manager import manager, mensaje_evento
+import asyncio
+import logging
+import os
+import time
 from sqlalchemy import text
 from . import models, schemas, crud
-from .database import engine, get_db
-from . import auth
+from .database import engine, async_engine, get_async_db, AsyncSessionLocal
+from . import auth, eventos, idempotencia
+from .idempotencia import Idempotencia, idempotencia_de
+from .catalogo import catalogo, responder_catalogo
+from .cola_tareas import cola_tareas
+from .eventos import bus
+from .principales import Principal, principales
+from .metricas import registro
+from .observabilidad import MiddlewareMetricas, instrumentar
+from .serializacion import RespuestaJSON
 
-# Si necesitas crear tablas automáticamente en dev:
-# models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# Cada cuántos segundos se reconcilia la cola en memoria de cocina/bar con la BD.
+# Los cambios de otros workers llegan por el bus de eventos; esto es una red de seguridad.
+COLA_TAREAS_RECONCILIAR_SEG = float(os.environ.get("COLA_TAREAS_RECONCILIAR_SEG", "30"))
+
+# El esquema lo crean las migraciones de Alembic: python -m app.esquema --migrar
+# (en producción lo hace gunicorn.conf.py al arrancar)
 
 app = FastAPI(
     title="API de App de Restaurante",
     description="El backend para gestionar pedidos, mesas y menú.",
-    version="0.1.0"
+    version="0.1.0",
+    # orjson para todas las respuestas; los listados además evitan response_model (app/serializacion.py)
+    default_response_class=RespuestaJSON,
 )
 
+# Latencia, códigos y sentencias SQL por ruta (ver app/observabilidad.py y /metrics)
+app.add_middleware(MiddlewareMetricas)
+instrumentar(engine)
+instrumentar(async_engine.sync_engine)
+
 # incluye routers en archivos separados (asegúrate de importarlos en package)
 from .routers import auth as auth_router
 app.include_router(auth_router.router)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(auth.oauth2_scheme)):
+async def get_current_user(db: AsyncSession = Depends(get_async_db), token: str = Depends(auth.oauth2_scheme)) -> Principal:
+    """
+    Valida token y retorna el Principal (id, nombre, rol) del usuario.
+    FastAPI cachea esta dependencia por petición, así que se resuelve una sola vez aunque
+    la usen el router y la ruta.
+    """
+    return await db.run_sync(resolver_principal, token)
+
+def resolver_principal(db: Session, token: str) -> Principal:
     """
-    Valida token y retorna instancia de Usuario desde DB.
     decode_access_token devuelve {'user_id': int, 'role': str}
+    Se resuelve desde la caché de principales; la BD sólo se consulta si no está o expiró.
     """
     token_data = auth.decode_access_token(token)
-    user = db.query(models.Usuario).filter(models.Usuario.id == token_data['user_id']).first()
+    principal = principales.obtener(token_data['user_id'])
+    if principal is not None:
+        return principal
+    user = db.query(models.Usuario.id, models.Usuario.nombre, models.Usuario.rol).filter(
+        models.Usuario.id == token_data['user_id']
+    ).first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario no encontrado",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    return principales.guardar(Principal(id=user.id, nombre=user.nombre, rol=user.rol))
 
 @app.get("/")
-def leer_raiz():
+async def leer_raiz():
     return {"mensaje": "¡Bienvenido al backend del restaurante!"}
 
 @app.post("/productos/", response_model=schemas.Producto)
-def crear_producto(
+async def crear_producto(
     producto: schemas.ProductoCreate,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     if current_user.rol.value not in ['admin']:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso denegado. Solo Admin.")
 
     try:
-        return crud.create_producto(db=db, producto=producto)
+        return await crud.create_producto_async(db=db, producto=producto)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         raise HTTPException(status_code=500, detail="Error interno al crear el producto.")
 
 @app.get("/productos/", response_model=List[schemas.Producto])
-def leer_productos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    productos = crud.get_productos(db, skip=skip, limit=limit)
-    return productos
+async def leer_productos(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Menú desde el catálogo cacheado; responde 304 si el If-None-Match coincide.
+    Preferir `cursor` (cabecera X-Cursor-Siguiente) a `skip` para recorrer páginas.
+    """
+    return responder_catalogo(
+        request, await crud.get_catalogo_async(db), skip=skip, limit=limit, cursor=cursor
+    )
 
 @app.post("/pedidos/", response_model=schemas.Pedido)
-def tomar_pedido(
+async def tomar_pedido(
     pedido: schemas.PedidoCreate,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     if current_user.rol.value != 'mesero':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo los meseros pueden tomar pedidos.")
     if pedido.mesero_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puedes tomar pedidos a nombre de otro mesero.")
     try:
-        return crud.create_pedido(db=db, pedido=pedido)
+        return await idempotencia.ejecutar(
+            db, idem, current_user.id, crud.create_pedido, cuerpo=pedido.model_dump(), pedido=pedido
+        )
     except HTTPException as e:
         raise e
     except Exception:
         raise HTTPException(status_code=500, detail="Error interno al procesar el pedido.")
 
 @app.get("/tareas/cocina/", response_model=List[schemas.TareaItem])
-def obtener_tareas_cocina(
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+async def obtener_tareas_cocina(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     if current_user.rol.value not in ['cocina', 'admin']:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso denegado a Cocina.")
-    return crud.get_tareas_pendientes(db, destino='cocina')
+    return RespuestaJSON(await crud.get_tareas_pendientes_async(db, destino='cocina'))
 
 @app.get("/tareas/bar/", response_model=List[schemas.TareaItem])
-def obtener_tareas_bar(
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+async def obtener_tareas_bar(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     if current_user.rol.value not in ['bar', 'admin']:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso denegado a Bar.")
-    return crud.get_tareas_pendientes(db, destino='bar')
+    return RespuestaJSON(await crud.get_tareas_pendientes_async(db, destino='bar'))
 
 @app.put("/item-pedido/{item_id}/listo", response_model=schemas.ItemPedido)
-def marcar_item_como_listo(
+async def marcar_item_como_listo(
     item_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     # Validación de rol
     if current_user.rol.value not in ['cocina', 'bar', 'admin']:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo personal de producción puede usar este endpoint.")
     try:
-        return crud.marcar_item_listo(db, item_id=item_id)
+        destino = None if current_user.rol.value == 'admin' else current_user.rol.value
+        return await idempotencia.ejecutar(
+            db, idem, current_user.id, crud.marcar_item_listo, item_id=item_id, destino=destino
+        )
     except HTTPException as e:
         raise e
     except Exception:
         raise HTTPException(status_code=500, detail="Error interno al actualizar el ítem.")
 
 @app.put("/pedidos/{pedido_id}/servido", response_model=schemas.Pedido)
-def pedido_servido(
+async def pedido_servido(
     pedido_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     if current_user.rol.value not in ['mesero', 'admin']:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo meseros pueden servir pedidos.")
     try:
-        return crud.marcar_pedido_servido(db, pedido_id)
+        return await idempotencia.ejecutar(db, idem, current_user.id, crud.marcar_pedido_servido, pedido_id=pedido_id)
     except HTTPException as e:
         raise e
 
 @app.put("/pedidos/{pedido_id}/cerrado", response_model=schemas.Pedido)
-def pedido_cerrado(
+async def pedido_cerrado(
     pedido_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     if current_user.rol.value not in ['mesero', 'admin']:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo meseros pueden cerrar pedidos.")
     try:
-        return crud.cerrar_pedido(db, pedido_id)
+        return await idempotencia.ejecutar(db, idem, current_user.id, crud.cerrar_pedido, pedido_id=pedido_id)
     except HTTPException as e:
         raise e
 
-@app.websocket("/ws/notifications/")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            await websocket.send_text(json.dumps({"type": "PONG", "message": f"Server received: {data}"}))
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
-    except Exception as e:
-        print(f"Error en el WebSocket: {e}")
-        manager.disconnect(websocket)
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metricas():
+    """Métricas del worker en formato de texto de Prometheus."""
+    return registro.exportar()
+
+# El probe de la BD se repite como mucho cada HEALTH_DB_INTERVALO_SEG por worker; entre
+# medio /health responde con el último resultado sin tomar una conexión del pool.
+HEALTH_DB_INTERVALO_SEG = float(os.environ.get("HEALTH_DB_INTERVALO_SEG", "10"))
+_ultimo_probe = {"en": float("-inf"), "error": None}
+_lock_probe = asyncio.Lock()
+
+async def _probar_bd():
+    async with _lock_probe:
+        if time.monotonic() - _ultimo_probe["en"] < HEALTH_DB_INTERVALO_SEG:
+            return _ultimo_probe["error"]
+        try:
+            # simple select para verificar conexión
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            _ultimo_probe["error"] = None
+        except Exception as e:
+            _ultimo_probe["error"] = str(e)
+        _ultimo_probe["en"] = time.monotonic()
+        return _ultimo_probe["error"]
 
 @app.get("/health")
-def check_health(db: Session = Depends(get_db)):
-    try:
-        # simple select para verificar conexión
-        db.execute(text("SELECT 1"))
-        # no es estrictamente necesario commit en SELECT, pero lo dejamos
-        db.commit()
-        return {
-            "status": "ok",
-            "database_connection": "successful",
-            "api_version": app.version
-        }
-    except Exception as e:
+async def check_health():
+    error = await _probar_bd()
+    if error is not None:
         raise HTTPException(status_code=503, detail={
             "status": "error",
             "database_connection": "failed",
-            "detail": str(e)
+            "detail": error
         })
+    return {
+        "status": "ok",
+        "database_connection": "successful",
+        "api_version": app.version
+    }
+
+# === COLA DE TAREAS EN MEMORIA ===
+async def _bucle_reconciliacion():
+    """Corrige periódicamente la cola en memoria (ítems creados o marcados en otro worker)."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.reconciliar_cola_tareas_async(db)
+        except Exception as e:
+            logger.warning("No se pudo reconciliar la cola de tareas: %s", e)
+        await asyncio.sleep(COLA_TAREAS_RECONCILIAR_SEG)
+
+@app.on_event("startup")
+async def iniciar_reconciliacion():
+    app.state.tarea_reconciliacion = asyncio.create_task(_bucle_reconciliacion())
+
+@app.on_event("shutdown")
+async def detener_reconciliacion():
+    app.state.tarea_reconciliacion.cancel()
+
+# === LIMPIEZA DE CLAVES DE IDEMPOTENCIA Y EVENTOS ===
+IDEMPOTENCIA_PURGA_SEG = float(os.environ.get("IDEMPOTENCIA_PURGA_SEG", "3600"))
+
+async def _bucle_purga_idempotencia():
+    """Borra periódicamente las Idempotency-Key vencidas y los eventos fuera de retención."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(idempotencia.purgar)
+        except Exception as e:
+            logger.warning("No se pudieron purgar las claves de idempotencia: %s", e)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(eventos.purgar)
+        except Exception as e:
+            logger.warning("No se pudieron purgar los eventos: %s", e)
+        await asyncio.sleep(IDEMPOTENCIA_PURGA_SEG)
+
+@app.on_event("startup")
+async def iniciar_purga_idempotencia():
+    app.state.tarea_purga_idempotencia = asyncio.create_task(_bucle_purga_idempotencia())
+
+@app.on_event("shutdown")
+async def detener_purga_idempotencia():
+    app.state.tarea_purga_idempotencia.cancel()
+
+@app.on_event("shutdown")
+def cerrar_ejecutor_hash():
+    auth.cerrar_ejecutor_hash()
+
+# === BUS DE EVENTOS ENTRE WORKERS ===
+def _aplicar_evento(evento: dict):
+    """Mantiene las cachés de este worker al día con lo que hacen los demás workers."""
+    tipo, datos = evento["tipo"], evento["datos"]
+    if tipo == "resincronizar":
+        cola_tareas.invalidar()
+        catalogo.invalidar()
+        principales.invalidar()
+        return
+    if evento["origen"] == eventos.ORIGEN:
+        # Este worker ya actualizó sus cachés al hacer el cambio
+        return
+    if tipo in ("pedido_creado", "items_agregados"):
+        destinos = {item["destino"] for item in datos.get("items", [])}
+        if datos.get("truncado"):
+            cola_tareas.invalidar()
+        for destino in destinos:
+            cola_tareas.invalidar(destino)
+    elif tipo == "item_listo":
+        cola_tareas.quitar(datos["item_id"], datos["destino"])
+    elif tipo == "items_listos":
+        if datos.get("truncado"):
+            cola_tareas.invalidar()
+        for item in datos.get("items", []):
+            cola_tareas.quitar(item["item_id"], item["destino"])
+    elif tipo == "catalogo_actualizado":
+        catalogo.invalidar()
+    elif tipo == "usuario_modificado":
+        principales.invalidar(datos["usuario_id"])
+
+async def _relevar_evento(evento: dict):
+    """Reenvía el evento a los WebSockets de este worker suscritos a sus tópicos."""
+    if not evento.get("topicos"):
+        return
+    await manager.publicar(
+        evento["topicos"], mensaje_evento(evento["tipo"], evento["datos"], evento.get("seq")), evento.get("seq")
+    )
+
+bus.suscribir(_aplicar_evento)
+bus.suscribir(_relevar_evento)
+
+@app.on_event("startup")
+async def iniciar_bus():
+    await bus.iniciar()
+
+@app.on_event("shutdown")
+async def detener_bus():
+    await bus.detener()
+
+# === ARRANQUE ===
+ARRANQUE = registro.medidor(
+    "arranque_segundos", "Arranque: import de la app (maestro) y worker desde el fork hasta quedar listo", ["fase"]
+)
+
+@app.on_event("startup")
+async def registrar_arranque():
+    # Registrado después de los demás startup: corre cuando el worker ya está listo.
+    # gunicorn.conf.py deja en el entorno el import del maestro y la hora del fork
+    if "ARRANQUE_FORK" not in os.environ:
+        return
+    worker = time.time() - float(os.environ["ARRANQUE_FORK"])
+    importacion = float(os.environ.get("ARRANQUE_IMPORT_SEG", "0"))
+    ARRANQUE.set(importacion, fase="import")
+    ARRANQUE.set(worker, fase="worker")
+    # Al log del servidor (uvicorn.error), junto a "Application startup complete"
+    logging.getLogger("uvicorn.error").info(
+        "Worker %d listo en %.2f s desde el fork (app importada una vez en el maestro: %.2f s)",
+        os.getpid(), worker, importacion,
+    )
+
+# Routers /api/v1 y /ws. Se importan al final porque dependen de get_current_user.
+from .routers import gestion, pedidos, reportes, tareas, websocket as websocket_router
+app.include_router(gestion.router)
+app.include_router(pedidos.router)
+app.include_router(reportes.router)
+app.include_router(tareas.router)
+app.include_router(websocket_router.router)
+app.add_api_websocket_route("/ws/notifications/", websocket_router.websocket_endpoint)
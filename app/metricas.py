@@ -0,0 +1,128 @@
+# app/metricas.py
+"""
+Métricas en memoria del proceso, exportadas en formato de texto de Prometheus (/metrics).
+Implementación mínima (contador, medidor e histograma con etiquetas) para no sumar
+dependencias. Cada worker de gunicorn tiene su propio registro.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Buckets por defecto en segundos, pensados para latencias de peticiones y de hash
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _etiquetas(nombres: Tuple[str, ...], valores: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{n}="{v}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _clave(self, valores: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(valores.get(e, "")) for e in self.etiquetas)
+
+    def exportar(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, cantidad: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def exportar(self) -> List[str]:
+        lineas = super().exportar()
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}")
+        return lineas
+
+
+class Medidor(Contador):
+    tipo = "gauge"
+
+    def dec(self, cantidad: float = 1, **etiquetas):
+        self.inc(-cantidad, **etiquetas)
+
+    def set(self, valor: float, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # clave -> [conteos por bucket..., suma, total]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.setdefault(clave, [0] * (len(self.buckets) + 2))
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exportar(self) -> List[str]:
+        lineas = super().exportar()
+        with self._lock:
+            for clave, serie in sorted(self._series.items()):
+                for limite, conteo in zip(self.buckets, serie):
+                    le = f'le="{limite}"'
+                    lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {conteo}")
+                le = 'le="+Inf"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {serie[-1]}")
+                lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {serie[-2]}")
+                lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {serie[-1]}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+
+    def _registrar(self, metrica: _Metrica):
+        if metrica.nombre in self._metricas:
+            raise ValueError(f"Métrica duplicada: {metrica.nombre}")
+        self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = ()) -> Medidor:
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (), buckets=BUCKETS_SEGUNDOS) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def exportar(self) -> str:
+        lineas: List[str] = []
+        for metrica in self._metricas.values():
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
@@ -1,7 +1,8 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Float, Boolean, Enum, ForeignKey, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Boolean, Enum, ForeignKey, Date, DateTime, Index
 from sqlalchemy.orm import relationship
 from .database import Base
+from .dinero import Dinero, instalar_total_pedido
 import enum
 from datetime import datetime
 class CategoriaProducto(enum.Enum):
@@ -30,11 +31,16 @@ class EstadoItem(enum.Enum):
     pendiente = "pendiente"
     en_preparacion = "en_preparacion"
     listo = "listo"
+class DimensionVenta(enum.Enum):
+    mesero = "mesero"
+    mesa = "mesa"
+    producto = "producto"
 class Producto(Base):
     __tablename__ = "productos"
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String, index=True, unique=True)
-    precio = Column(Float)
+    # Montos en centavos en la BD, unidades en Python (ver app/dinero.py)
+    precio = Column("precio_centavos", Dinero, key="precio")
     categoria = Column(Enum(CategoriaProducto))
     disponible = Column(Boolean, default=True)
 class Usuario(Base):
@@ -57,12 +63,22 @@ class Mesa(Base):
 class Pedido(Base):
 
     __tablename__ = "pedidos"
+    # Historial paginado por (fecha_creacion, id), general y por mesero; plano: pedidos abiertos por mesa
+    __table_args__ = (
+        Index("ix_pedidos_fecha_id", "fecha_creacion", "id"),
+        Index("ix_pedidos_mesero_fecha_id", "mesero_id", "fecha_creacion", "id"),
+        Index("ix_pedidos_mesa_estado", "mesa_id", "estado"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     mesa_id = Column(Integer, ForeignKey("mesas.id"))
     mesero_id = Column(Integer, ForeignKey("usuarios.id"))
     estado = Column(Enum(EstadoPedido), default=EstadoPedido.nuevo)
-    total = Column(Float, default=0.0)
+    # Lo mantienen los triggers de items_pedido (app/dinero.py); crud no lo escribe
+    total = Column("total_centavos", Dinero, key="total", nullable=False, default=0, server_default="0")
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    # Avance de los ítems: cuando items_listos llega a items_total el pedido queda listo_para_servir
+    items_total = Column(Integer, nullable=False, default=0, server_default="0")
+    items_listos = Column(Integer, nullable=False, default=0, server_default="0")
 
     mesa = relationship("Mesa", back_populates="pedido_actual")
     mesero = relationship("Usuario", back_populates="pedidos")
@@ -70,12 +86,57 @@ class Pedido(Base):
 
 class ItemPedido(Base):
     __tablename__ = "items_pedido"
+    # Cola de cocina/bar: filtra siempre por destino y estado
+    __table_args__ = (Index("ix_items_pedido_destino_estado", "destino", "estado"),)
     id = Column(Integer, primary_key=True, index=True)
     pedido_id = Column(Integer, ForeignKey("pedidos.id"))
     producto_id = Column(Integer, ForeignKey("productos.id"))
     cantidad = Column(Integer)
     estado = Column(Enum(EstadoItem), default=EstadoItem.pendiente)
     destino = Column(Enum(DestinoItem))
+    # Precio del producto al momento de pedirlo
+    precio_unitario = Column("precio_unitario_centavos", Dinero, key="precio_unitario", nullable=False, default=0, server_default="0")
 
     pedido = relationship("Pedido", back_populates="items")
     producto = relationship("Producto")
+
+instalar_total_pedido(ItemPedido.__table__)
+
+class ResumenVentas(Base):
+    """
+    Ventas acumuladas por día y dimensión (mesero, mesa o producto), de pedidos cerrados.
+    crud.cerrar_pedido la actualiza en la misma transacción; `python -m app.reportes`
+    la reconstruye desde pedidos e items_pedido.
+    """
+    __tablename__ = "resumen_ventas"
+    dia = Column(Date, primary_key=True)
+    dimension = Column(Enum(DimensionVenta), primary_key=True)
+    # id del mesero, la mesa o el producto según la dimensión
+    clave = Column(Integer, primary_key=True)
+    pedidos = Column(Integer, nullable=False, default=0)
+    unidades = Column(Integer, nullable=False, default=0)
+    ingresos = Column("ingresos_centavos", Dinero, key="ingresos", nullable=False, default=0)
+
+class ClaveIdempotencia(Base):
+    """Idempotency-Key recibida por usuario y la respuesta que se devolvió (ver app/idempotencia.py)."""
+    __tablename__ = "claves_idempotencia"
+    usuario_id = Column(Integer, primary_key=True)
+    clave = Column(String(255), primary_key=True)
+    ruta = Column(String, nullable=False)
+    # sha256 de ruta + cuerpo: la misma clave con otra petición es un error del cliente
+    huella = Column(String(64), nullable=False)
+    # JSON de la respuesta; NULL mientras la petición está en curso
+    respuesta = Column(Text, nullable=True)
+    creada_en = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class Evento(Base):
+    """Eventos enviados a los WebSockets, con número de secuencia (outbox, ver app/eventos.py)."""
+    __tablename__ = "eventos"
+    # En SQLite sin AUTOINCREMENT un seq purgado podría reutilizarse
+    __table_args__ = {"sqlite_autoincrement": True}
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    tipo = Column(String(64), nullable=False)
+    # Listas/objetos en JSON
+    topicos = Column(Text, nullable=False)
+    datos = Column(Text, nullable=False)
+    creado_en = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -0,0 +1,151 @@
+# app/observabilidad.py
+"""
+Métricas por ruta y sentencias SQL por petición, exportadas en /metrics.
+Un middleware ASGI mide cada petición HTTP (latencia por plantilla de ruta, códigos de
+respuesta y peticiones en curso) y abre una `Medicion` en un ContextVar; los eventos de los
+engines suman ahí cada sentencia y su tiempo. Las sesiones async ejecutan en un greenlet
+que comparte el contexto de la petición, así que se cuentan igual que las sync. Lo que
+corre fuera de una petición (bucles de fondo, WebSockets) se cuenta con ruta "-".
+
+Una petición con más de CONSULTAS_PRESUPUESTO sentencias queda en el log como posible N+1,
+con la sentencia que más se repitió.
+"""
+
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metricas import registro
+
+logger = logging.getLogger(__name__)
+
+# Sentencias por petición a partir de las cuales se avisa de un posible N+1 (0 desactiva)
+CONSULTAS_PRESUPUESTO = int(os.environ.get("CONSULTAS_PRESUPUESTO", "20"))
+# Etiqueta de las peticiones que no coinciden con ninguna ruta (404, estáticos)
+SIN_RUTA = "sin_ruta"
+FUERA_DE_PETICION = "-"
+BUCKETS_SENTENCIAS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100)
+
+HTTP_LATENCIA = registro.histograma(
+    "http_peticion_segundos", "Duración de las peticiones HTTP por ruta", ["metodo", "ruta"]
+)
+HTTP_RESPUESTAS = registro.contador(
+    "http_respuestas_total", "Respuestas HTTP por ruta y código", ["metodo", "ruta", "codigo"]
+)
+HTTP_EN_CURSO = registro.medidor("http_peticiones_en_curso", "Peticiones HTTP en curso en este worker")
+DB_SENTENCIAS_PETICION = registro.histograma(
+    "db_sentencias_por_peticion", "Sentencias SQL ejecutadas por petición", ["metodo", "ruta"],
+    buckets=BUCKETS_SENTENCIAS,
+)
+DB_TIEMPO_PETICION = registro.histograma(
+    "db_tiempo_por_peticion_segundos", "Tiempo en la BD por petición", ["metodo", "ruta"]
+)
+DB_SENTENCIAS = registro.contador("db_sentencias_total", "Sentencias SQL ejecutadas, por ruta", ["ruta"])
+DB_TIEMPO = registro.contador("db_tiempo_segundos_total", "Tiempo en la BD, por ruta", ["ruta"])
+POSIBLES_N_MAS_1 = registro.contador(
+    "db_peticiones_sobre_presupuesto_total", "Peticiones que superaron CONSULTAS_PRESUPUESTO", ["metodo", "ruta"]
+)
+
+
+class Medicion:
+    """Sentencias y tiempo en la BD acumulados por una petición."""
+    __slots__ = ("sentencias", "segundos", "textos")
+
+    def __init__(self):
+        self.sentencias = 0
+        self.segundos = 0.0
+        self.textos: Counter = Counter()
+
+
+_medicion: ContextVar[Optional[Medicion]] = ContextVar("medicion", default=None)
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    # En el contexto de ejecución y no en la conexión: si la sentencia falla no hay
+    # after_cursor_execute y el inicio se descarta con el contexto
+    if context is not None:
+        context._inicio = time.perf_counter()
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "_inicio", None)
+    if inicio is None:
+        return
+    segundos = time.perf_counter() - inicio
+    medicion = _medicion.get()
+    if medicion is None:
+        DB_SENTENCIAS.inc(ruta=FUERA_DE_PETICION)
+        DB_TIEMPO.inc(segundos, ruta=FUERA_DE_PETICION)
+        return
+    medicion.sentencias += 1
+    medicion.segundos += segundos
+    medicion.textos[statement] += 1
+
+
+def instrumentar(engine: Engine):
+    """Cuenta las sentencias del engine (para un AsyncEngine, pasar su sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(engine, "after_cursor_execute", _despues_de_ejecutar)
+
+
+def _ruta(scope) -> str:
+    # FastAPI deja en el scope la ruta que atendió la petición; su path es la plantilla
+    # (/pedidos/{pedido_id}), así las etiquetas no crecen con cada id
+    ruta = scope.get("route")
+    return getattr(ruta, "path", None) or SIN_RUTA
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI (no BaseHTTPMiddleware: no agrega una tarea por petición)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        codigo = 500
+
+        async def enviar(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+
+        HTTP_EN_CURSO.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            HTTP_EN_CURSO.dec()
+            _medicion.reset(token)
+            self._registrar(scope["method"], _ruta(scope), codigo, duracion, medicion)
+
+    @staticmethod
+    def _registrar(metodo: str, ruta: str, codigo: int, duracion: float, medicion: Medicion):
+        HTTP_LATENCIA.observe(duracion, metodo=metodo, ruta=ruta)
+        HTTP_RESPUESTAS.inc(metodo=metodo, ruta=ruta, codigo=codigo)
+        DB_SENTENCIAS_PETICION.observe(medicion.sentencias, metodo=metodo, ruta=ruta)
+        DB_TIEMPO_PETICION.observe(medicion.segundos, metodo=metodo, ruta=ruta)
+        if medicion.sentencias:
+            DB_SENTENCIAS.inc(medicion.sentencias, ruta=ruta)
+            DB_TIEMPO.inc(medicion.segundos, ruta=ruta)
+        if CONSULTAS_PRESUPUESTO and medicion.sentencias > CONSULTAS_PRESUPUESTO:
+            POSIBLES_N_MAS_1.inc(metodo=metodo, ruta=ruta)
+            sentencia, veces = medicion.textos.most_common(1)[0]
+            logger.warning(
+                "Posible N+1: %s %s ejecutó %d sentencias (%.1f ms en la BD, %.1f ms en total); "
+                "la más repetida (%d veces): %s",
+                metodo, ruta, medicion.sentencias, medicion.segundos * 1000, duracion * 1000,
+                veces, " ".join(sentencia.split())[:300],
+            )
@@ -0,0 +1,99 @@
+# app/paginacion.py
+"""
+Paginación por cursor (keyset) y respuestas NDJSON para listados grandes.
+Con OFFSET la BD recorre y descarta todas las filas anteriores; con keyset cada página
+parte de la última clave vista (`WHERE (fecha, id) < (:fecha, :id)`) sobre un índice,
+así la página 1000 cuesta lo mismo que la primera.
+El cursor es opaco para el cliente: la clave de la última fila en JSON + base64url.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+
+from .database import AsyncSessionLocal
+from .serializacion import a_json, extractor
+
+PAGINA_LIMITE_DEFECTO = int(os.environ.get("PAGINA_LIMITE_DEFECTO", "100"))
+PAGINA_LIMITE_MAX = int(os.environ.get("PAGINA_LIMITE_MAX", "500"))
+# Filas que trae cada viaje del cursor del servidor en modo NDJSON
+NDJSON_LOTE = int(os.environ.get("NDJSON_LOTE", "500"))
+# Cabecera con el cursor de la página siguiente (ausente en la última página)
+CABECERA_CURSOR = "X-Cursor-Siguiente"
+MEDIA_NDJSON = "application/x-ndjson"
+
+
+def codificar_cursor(*valores: Any) -> str:
+    datos = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in valores])
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, tipos: Sequence[type]) -> Tuple[Any, ...]:
+    """Valores de la clave del cursor, convertidos a `tipos`; 400 si no es un cursor válido."""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(valores) != len(tipos):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(v) if tipo is datetime else tipo(v) for v, tipo in zip(valores, tipos)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+def limite(limit: Optional[int]) -> int:
+    if limit is None:
+        return PAGINA_LIMITE_DEFECTO
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit debe ser mayor que 0.")
+    return min(limit, PAGINA_LIMITE_MAX)
+
+
+def aplicar_keyset(consulta: Select, columnas: Sequence, cursor: Optional[str], tipos: Sequence[type],
+                   descendente: bool = False) -> Select:
+    """Ordena por `columnas` y, si hay cursor, continúa después de la última clave vista."""
+    if cursor:
+        clave = decodificar_cursor(cursor, tipos)
+        fila = tuple_(*columnas)
+        consulta = consulta.where(fila < tuple_(*clave) if descendente else fila > tuple_(*clave))
+    orden = [c.desc() for c in columnas] if descendente else list(columnas)
+    return consulta.order_by(*orden)
+
+
+def cortar_pagina(filas: List, limit: int, clave) -> Tuple[List, Optional[str]]:
+    """
+    Las consultas piden limit + 1 filas: si llega la fila extra hay página siguiente.
+    Devuelve la página y el cursor de la siguiente (None si es la última).
+    """
+    if len(filas) <= limit:
+        return filas, None
+    filas = filas[:limit]
+    return filas, codificar_cursor(*clave(filas[-1]))
+
+
+def poner_cursor(response: Response, cursor: Optional[str]):
+    if cursor is not None:
+        response.headers[CABECERA_CURSOR] = cursor
+
+
+def responder_ndjson(consulta: Select, esquema: Type[BaseModel]) -> StreamingResponse:
+    """
+    Una fila por línea a medida que llegan del cursor del servidor, sin armar la lista.
+    Abre su propia sesión: el cuerpo se escribe después de que la ruta retornó.
+    """
+    extraer = extractor(esquema)
+
+    async def filas() -> AsyncIterator[bytes]:
+        async with AsyncSessionLocal() as db:
+            resultado = await db.stream_scalars(consulta.execution_options(yield_per=NDJSON_LOTE))
+            async for fila in resultado:
+                yield a_json(extraer(fila)) + b"\n"
+
+    return StreamingResponse(filas(), media_type=MEDIA_NDJSON)
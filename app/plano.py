@@ -0,0 +1,122 @@
+# app/plano.py
+"""
+Plano del salón: cada mesa con su estado, su pedido abierto, el total y el avance de los
+ítems en una sola consulta (mesas LEFT JOIN pedidos no cerrados, agregando los contadores
+items_total / items_listos, sin leer items_pedido).
+
+Mesa.estado se mantiene en la misma transacción que cambia sus pedidos: 'ocupada' mientras
+tenga un pedido sin servir, 'pendiente_pago' cuando todos fueron servidos y 'libre' al
+cerrarse el último. Cada cambio publica 'mesa_actualizada' con la fila completa del plano
+(tópicos 'plano' y 'mesa:N'): el cliente reemplaza esa mesa sin volver a pedir el plano.
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import Row, and_, case, func, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .eventos import bus
+from .websocket_manager import TOPICO_PLANO
+
+Mesa = models.Mesa
+Pedido = models.Pedido
+EstadoMesa = models.EstadoMesa
+
+
+def consulta_plano(mesa_id: Optional[int] = None):
+    """Filas del plano por id de mesa (todas, o sólo `mesa_id`)."""
+    abiertos = and_(Pedido.mesa_id == Mesa.id, Pedido.estado != models.EstadoPedido.cerrado)
+    consulta = (
+        select(
+            Mesa.id,
+            Mesa.nombre,
+            Mesa.estado,
+            # Con más de una ronda abierta en la mesa se muestra la más reciente
+            func.max(Pedido.id).label("pedido_id"),
+            func.count(Pedido.id).label("pedidos_abiertos"),
+            func.coalesce(func.sum(Pedido.total), 0.0).label("total"),
+            func.coalesce(func.sum(Pedido.items_total), 0).label("items_total"),
+            func.coalesce(func.sum(Pedido.items_listos), 0).label("items_listos"),
+            func.coalesce(func.sum(case((Pedido.estado != models.EstadoPedido.servido, 1), else_=0)), 0)
+            .label("sin_servir"),
+        )
+        .outerjoin(Pedido, abiertos)
+        .group_by(Mesa.id, Mesa.nombre, Mesa.estado)
+        .order_by(Mesa.id)
+    )
+    if mesa_id is not None:
+        consulta = consulta.where(Mesa.id == mesa_id)
+    return consulta
+
+
+def _fila(fila: Row, estado: Optional[EstadoMesa] = None) -> dict:
+    return {
+        "id": fila.id,
+        "nombre": fila.nombre,
+        "estado": (estado or fila.estado).value,
+        "pedido_id": fila.pedido_id,
+        "pedidos_abiertos": fila.pedidos_abiertos,
+        "total": fila.total,
+        "items_total": fila.items_total,
+        "items_listos": fila.items_listos,
+    }
+
+
+def get_plano(db: Session) -> List[dict]:
+    return [_fila(f) for f in db.execute(consulta_plano())]
+
+
+def _estado_segun_pedidos(fila: Row) -> EstadoMesa:
+    if fila.sin_servir:
+        return EstadoMesa.ocupada
+    if fila.pedidos_abiertos:
+        return EstadoMesa.pendiente_pago
+    return EstadoMesa.libre
+
+
+def ocupar_mesa(db: Session, mesa_id: int) -> Optional[Row]:
+    """
+    Marca la mesa 'ocupada' al abrirle un pedido y devuelve (id, nombre), o None si no existe.
+    El UPDATE bloquea la fila de la mesa hasta el commit (ver sincronizar_mesa).
+    """
+    return db.execute(
+        update(Mesa)
+        .where(Mesa.id == mesa_id)
+        .values(estado=EstadoMesa.ocupada)
+        .returning(Mesa.id, Mesa.nombre)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+
+def sincronizar_mesa(db: Session, mesa_id: Optional[int]):
+    """
+    Recalcula el estado de la mesa desde sus pedidos abiertos y publica su fila del plano.
+    No hace commit. Primero bloquea la fila de la mesa: así la consulta siguiente ya ve un
+    pedido recién abierto en otra transacción, y no se libera una mesa que acaba de ocuparse.
+    """
+    if mesa_id is None:
+        return
+    db.execute(select(Mesa.id).where(Mesa.id == mesa_id).with_for_update())
+    fila = db.execute(consulta_plano(mesa_id)).first()
+    if fila is None:
+        return
+    estado = _estado_segun_pedidos(fila)
+    if estado != fila.estado:
+        db.execute(
+            update(Mesa).where(Mesa.id == mesa_id).values(estado=estado).execution_options(synchronize_session=False)
+        )
+    _publicar(db, _fila(fila, estado))
+
+
+def publicar_mesa(db: Session, mesa_id: Optional[int]):
+    """Publica la fila del plano de la mesa tal como queda en esta transacción (no hace commit)."""
+    if mesa_id is None:
+        return
+    fila = db.execute(consulta_plano(mesa_id)).first()
+    if fila is not None:
+        _publicar(db, _fila(fila))
+
+
+def _publicar(db: Session, fila: dict):
+    bus.publicar(db, "mesa_actualizada", fila, topicos=[TOPICO_PLANO, f"mesa:{fila['id']}"])
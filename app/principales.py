@@ -0,0 +1,102 @@
+# app/principales.py
+"""
+Caché de usuarios autenticados (principales) por id.
+get_current_user se ejecuta en cada petición autenticada; con esta caché la consulta a
+`usuarios` sólo ocurre cuando el principal no está, expiró o fue invalidado.
+Las entradas se invalidan al confirmar (commit) cambios o borrados de un Usuario.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+from .eventos import bus
+
+PRINCIPALES_TTL_SEG = float(os.environ.get("PRINCIPALES_TTL_SEG", "60"))
+PRINCIPALES_MAX = int(os.environ.get("PRINCIPALES_MAX", "1024"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Datos del usuario que usan las rutas para autorizar (id y rol)."""
+    id: int
+    nombre: str
+    rol: models.RolUsuario
+
+
+class CachePrincipales:
+    """LRU acotada con TTL; segura entre hilos del threadpool."""
+    def __init__(self, ttl: float = PRINCIPALES_TTL_SEG, max_entradas: int = PRINCIPALES_MAX):
+        self._lock = threading.Lock()
+        self._ttl = ttl
+        self._max = max_entradas
+        self._entradas: "OrderedDict[int, tuple[Principal, float]]" = OrderedDict()
+
+    def obtener(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada is None:
+                return None
+            principal, expira = entrada
+            if time.monotonic() >= expira:
+                del self._entradas[user_id]
+                return None
+            self._entradas.move_to_end(user_id)
+            return principal
+
+    def guardar(self, principal: Principal) -> Principal:
+        with self._lock:
+            self._entradas[principal.id] = (principal, time.monotonic() + self._ttl)
+            self._entradas.move_to_end(principal.id)
+            while len(self._entradas) > self._max:
+                self._entradas.popitem(last=False)
+        return principal
+
+    def invalidar(self, user_id: Optional[int] = None):
+        """Quita un usuario de la caché (o todos si no se indica id)."""
+        with self._lock:
+            if user_id is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(user_id, None)
+
+
+principales = CachePrincipales()
+
+
+# === INVALIDACIÓN AL CONFIRMAR CAMBIOS DE USUARIOS ===
+# Se marca en el flush y se invalida en el commit: invalidar antes del commit dejaría
+# que otra petición volviera a cachear la fila vieja. Los demás workers se enteran por
+# el evento 'usuario_modificado' del bus.
+@event.listens_for(models.Usuario, "after_update")
+@event.listens_for(models.Usuario, "after_delete")
+def _marcar_usuario_modificado(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("principales_modificados", set()).add(target.id)
+        session.info.setdefault("principales_por_publicar", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _publicar_usuarios_modificados(session, flush_context):
+    for user_id in session.info.pop("principales_por_publicar", ()):
+        bus.publicar(session, "usuario_modificado", {"usuario_id": user_id})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_usuarios_modificados(session):
+    for user_id in session.info.pop("principales_modificados", ()):
+        principales.invalidar(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_usuarios_modificados(session):
+    session.info.pop("principales_modificados", None)
+    session.info.pop("principales_por_publicar", None)
@@ -0,0 +1,201 @@
+# app/reportes.py
+"""
+Resúmenes de ventas para reportes (por día, mesero, mesa y producto).
+Los tableros se consultan durante el servicio: en vez de recorrer pedidos e items_pedido,
+leen `resumen_ventas`, que crud.cerrar_pedido actualiza de forma incremental (un upsert
+en la misma transacción del cierre). El total de un día es la suma de sus filas por
+mesero, así no existe una fila 'total' que todos los cierres tengan que bloquear.
+
+El día de un pedido es la fecha local (REPORTES_ZONA_HORARIA) en que se abrió, no la de
+su cierre: fecha_creacion se guarda en UTC y un pedido abierto a las 20:00 en Lima no
+debe caer en el día siguiente. `dia_de` es la única regla; la usan tanto el acumulado
+incremental como la reconstrucción. Si se cambia la zona hay que reconstruir.
+
+Reconstrucción desde los datos crudos:
+    python -m app.reportes [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Select, delete, func, insert, select, text, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+from .dinero import Dinero, a_centavos, a_unidades
+
+Resumen = models.ResumenVentas
+# Agrupaciones que exponen los reportes; 'dia' suma las filas por mesero de cada día
+AGRUPACIONES = ("dia", "mesero", "mesa", "producto")
+# Importe de cada ítem al precio con que se pidió (centavos en la BD, unidades al leerlo)
+IMPORTE_ITEM = type_coerce(models.ItemPedido.cantidad * models.ItemPedido.precio_unitario, Dinero())
+# Zona horaria del local: define a qué día pertenece cada pedido en los reportes
+REPORTES_ZONA_HORARIA = ZoneInfo(os.environ.get("REPORTES_ZONA_HORARIA", "America/Lima"))
+
+
+def dia_de(fecha_creacion: datetime) -> date:
+    """Día de un pedido en los reportes: fecha local de su apertura (fecha_creacion es UTC)."""
+    return fecha_creacion.replace(tzinfo=timezone.utc).astimezone(REPORTES_ZONA_HORARIA).date()
+
+
+def _inicio_del_dia(dia: date) -> datetime:
+    """Primer instante del día local `dia`, en UTC sin zona como fecha_creacion."""
+    inicio = datetime.combine(dia, time.min, tzinfo=REPORTES_ZONA_HORARIA)
+    return inicio.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _upsert(db: Session):
+    """INSERT ... ON CONFLICT que suma sobre la fila existente (Postgres y SQLite)."""
+    insertar = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insertar(Resumen)
+    return stmt.on_conflict_do_update(
+        index_elements=[Resumen.dia, Resumen.dimension, Resumen.clave],
+        set_={
+            "pedidos": Resumen.pedidos + stmt.excluded.pedidos,
+            "unidades": Resumen.unidades + stmt.excluded.unidades,
+            "ingresos": Resumen.ingresos + stmt.excluded.ingresos,
+        },
+    )
+
+
+def acumular_pedido_cerrado(db: Session, pedido: models.Pedido):
+    """
+    Suma un pedido recién cerrado a los resúmenes del día en que se abrió (`dia_de`). No
+    hace commit: corre dentro de la transacción del cierre, así el resumen nunca queda a
+    medias respecto del pedido.
+    """
+    por_producto = db.execute(
+        select(
+            models.ItemPedido.producto_id,
+            func.sum(models.ItemPedido.cantidad),
+            func.sum(IMPORTE_ITEM),
+        )
+        .where(models.ItemPedido.pedido_id == pedido.id)
+        .group_by(models.ItemPedido.producto_id)
+    ).all()
+    dia = dia_de(pedido.fecha_creacion)
+    unidades = sum(cantidad for _, cantidad, _ in por_producto)
+    filas = [
+        {"dimension": dimension, "clave": clave, "pedidos": 1, "unidades": unidades, "ingresos": pedido.total or 0.0}
+        for dimension, clave in (
+            (models.DimensionVenta.mesero, pedido.mesero_id),
+            (models.DimensionVenta.mesa, pedido.mesa_id),
+        )
+        if clave is not None
+    ]
+    filas += [
+        {"dimension": models.DimensionVenta.producto, "clave": producto_id, "pedidos": 1,
+         "unidades": cantidad, "ingresos": ingresos or 0.0}
+        for producto_id, cantidad, ingresos in por_producto
+    ]
+    # Mismo orden en todos los cierres: dos cierres concurrentes no se bloquean en cruz
+    filas.sort(key=lambda f: (f["dimension"].value, f["clave"]))
+    for fila in filas:
+        fila["dia"] = dia
+    db.execute(_upsert(db), filas)
+
+
+def reconstruir(db: Session, desde: Optional[date] = None, hasta: Optional[date] = None) -> int:
+    """
+    Recalcula resumen_ventas (todo o un rango de días, inclusive) desde los pedidos cerrados,
+    con los días de `dia_de`. No hace commit. En Postgres bloquea la tabla para escritura
+    mientras tanto: los cierres que lleguen esperan y se suman después, sin perderse ni
+    contarse dos veces.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE resumen_ventas IN EXCLUSIVE MODE"))
+
+    borrar = delete(Resumen)
+    pedidos = [models.Pedido.estado == models.EstadoPedido.cerrado]
+    if desde is not None:
+        borrar = borrar.where(Resumen.dia >= desde)
+        pedidos.append(models.Pedido.fecha_creacion >= _inicio_del_dia(desde))
+    if hasta is not None:
+        borrar = borrar.where(Resumen.dia <= hasta)
+        pedidos.append(models.Pedido.fecha_creacion < _inicio_del_dia(hasta + timedelta(days=1)))
+    db.execute(borrar)
+
+    # La BD agrupa por pedido y el día se asigna aquí con `dia_de`, la misma regla que en
+    # acumular_pedido_cerrado (SQLite no conoce las zonas horarias)
+    sumas = defaultdict(lambda: [0, 0, 0])  # (dia, dimension, clave) -> pedidos, unidades, centavos
+
+    def sumar(clave, unidades, importe):
+        suma = sumas[clave]
+        suma[0] += 1
+        suma[1] += unidades or 0
+        suma[2] += a_centavos(importe or 0)
+
+    unidades = (
+        select(models.ItemPedido.pedido_id, func.sum(models.ItemPedido.cantidad).label("unidades"))
+        .group_by(models.ItemPedido.pedido_id)
+        .subquery()
+    )
+    por_pedido = (
+        select(models.Pedido.fecha_creacion, models.Pedido.mesero_id, models.Pedido.mesa_id,
+               unidades.c.unidades, models.Pedido.total)
+        .outerjoin(unidades, unidades.c.pedido_id == models.Pedido.id)
+        .where(*pedidos)
+    )
+    for fecha, mesero_id, mesa_id, u, total in db.execute(por_pedido, execution_options={"yield_per": 1000}):
+        dia = dia_de(fecha)
+        for dimension, clave in ((models.DimensionVenta.mesero, mesero_id), (models.DimensionVenta.mesa, mesa_id)):
+            if clave is not None:
+                sumar((dia, dimension, clave), u, total)
+    por_producto = (
+        select(models.Pedido.fecha_creacion, models.ItemPedido.producto_id,
+               func.sum(models.ItemPedido.cantidad), func.sum(IMPORTE_ITEM))
+        .join(models.ItemPedido, models.ItemPedido.pedido_id == models.Pedido.id)
+        .where(*pedidos)
+        .group_by(models.Pedido.id, models.Pedido.fecha_creacion, models.ItemPedido.producto_id)
+    )
+    for fecha, producto_id, u, importe in db.execute(por_producto, execution_options={"yield_per": 1000}):
+        sumar((dia_de(fecha), models.DimensionVenta.producto, producto_id), u, importe)
+
+    filas = [
+        {"dia": dia, "dimension": dimension, "clave": clave, "pedidos": n, "unidades": u, "ingresos": a_unidades(c)}
+        for (dia, dimension, clave), (n, u, c) in sumas.items()
+    ]
+    if filas:
+        db.execute(insert(Resumen), filas)
+    return len(filas)
+
+
+def consulta_ventas(agrupar: str, desde: Optional[date] = None, hasta: Optional[date] = None) -> Select:
+    """Ventas agrupadas por día, mesero, mesa o producto, leídas sólo de resumen_ventas."""
+    if agrupar == "dia":
+        dimension, columna = models.DimensionVenta.mesero, Resumen.dia
+    else:
+        dimension, columna = models.DimensionVenta(agrupar), Resumen.clave
+    consulta = select(
+        columna.label("clave"),
+        func.sum(Resumen.pedidos).label("pedidos"),
+        func.sum(Resumen.unidades).label("unidades"),
+        func.sum(Resumen.ingresos).label("ingresos"),
+    ).where(Resumen.dimension == dimension)
+    if desde is not None:
+        consulta = consulta.where(Resumen.dia >= desde)
+    if hasta is not None:
+        consulta = consulta.where(Resumen.dia <= hasta)
+    return consulta.group_by(columna).order_by(columna)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstruye resumen_ventas desde los pedidos cerrados.")
+    parser.add_argument("--desde", type=date.fromisoformat, help="primer día (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="último día, inclusive (AAAA-MM-DD)")
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal
+    with SessionLocal() as db:
+        filas = reconstruir(db, args.desde, args.hasta)
+        db.commit()
+    print(f"resumen_ventas reconstruido: {filas} filas")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,46 @@
 # app/routers/auth.py
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import Usuario
-from app.auth import verify_password, create_access_token
+from app.auth import admision_login, verify_password_async, create_access_token
 
 router = APIRouter(prefix="/token", tags=["Autenticación"])
 
 @router.post("/", summary="Genera token de acceso con usuario y PIN")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
     Valida nombre y PIN (bcrypt hash) y devuelve un token JWT.
+    El bcrypt corre en un ejecutor dedicado (app.auth) y la consulta es async, así que el
+    login no ocupa hilos de las demás rutas; el exceso de intentos se rechaza con 429 antes
+    de tocar la BD.
     """
-    user = db.query(Usuario).filter(Usuario.nombre == form_data.username).first()
+    admision_login.admitir(form_data.username)
+    try:
+        user = (await db.execute(
+            select(Usuario.id, Usuario.pin, Usuario.rol).where(Usuario.nombre == form_data.username)
+        )).first()
 
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Usuario no encontrado",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuario no encontrado",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
 
-    # Verificar PIN con bcrypt
-    if not verify_password(form_data.password, user.pin):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="PIN incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        # Verificar PIN con bcrypt
+        if not await verify_password_async(form_data.password, user.pin):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="PIN incorrecto",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    finally:
+        admision_login.liberar(form_data.username)
 
     # Crear token JWT
     access_token_expires = timedelta(minutes=120)
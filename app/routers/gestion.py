@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Literal, Optional
 
 # Importaciones de la aplicación
-from app import schemas, models
-from app.database import get_db
-from app.crud import get_productos, create_producto
+from app import schemas, models, plano
+from app.database import get_async_db, engine, async_engine, estado_pool
+from app.crud import get_catalogo_async, create_producto_async, get_plano_async
+from app.catalogo import responder_catalogo
+from app.paginacion import aplicar_keyset, cortar_pagina, limite, poner_cursor, responder_ndjson
+from app.serializacion import responder
 from app.main import get_current_user # Asumo que get_current_user está en app.main
+from app.principales import Principal
 
 router = APIRouter(
     prefix="/api/v1/gestion",
@@ -16,7 +21,7 @@ router = APIRouter(
 )
 
 # --- FUNCIÓN DE VERIFICACIÓN DE ROL ---
-def check_admin(current_user: models.Usuario):
+def check_admin(current_user: Principal):
     """Verifica si el usuario actual tiene el rol de administrador."""
     if current_user.rol.value != models.RolUsuario.admin.value:
         raise HTTPException(
@@ -29,26 +34,35 @@ def check_admin(current_user: models.Usuario):
 # =======================================================
 
 @router.get("/productos", response_model=List[schemas.Producto])
-def read_productos(db: Session = Depends(get_db), current_user: models.Usuario = Depends(get_current_user)):
-    """Obtiene la lista de todos los productos (elementos del menú)."""
-    # Consulta simple, sin necesidad de ser admin
-    return get_productos(db)
+async def read_productos(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Obtiene la lista de productos (elementos del menú); sin `limit`, el menú completo."""
+    # Sin necesidad de ser admin; se sirve desde el catálogo cacheado con ETag
+    return responder_catalogo(
+        request, await get_catalogo_async(db),
+        limit=None if limit is None else limite(limit), cursor=cursor
+    )
 
 @router.post("/productos", response_model=schemas.Producto, status_code=status.HTTP_201_CREATED)
-def create_new_producto(
+async def create_new_producto(
     producto: schemas.ProductoCreate,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Crea un nuevo producto en el menú. Requiere rol 'admin'."""
     check_admin(current_user)
 
     # Comprobar si ya existe un producto con ese nombre
-    existing_producto = db.query(models.Producto).filter(models.Producto.nombre == producto.nombre).first()
+    existing_producto = await db.scalar(select(models.Producto.id).where(models.Producto.nombre == producto.nombre))
     if existing_producto:
         raise HTTPException(status_code=400, detail="Ya existe un producto con este nombre.")
 
-    return create_producto(db, producto=producto)
+    return await create_producto_async(db, producto=producto)
 
 
 # =======================================================
@@ -56,27 +70,65 @@ def create_new_producto(
 # =======================================================
 
 @router.get("/mesas", response_model=List[schemas.Mesa])
-def read_mesas(db: Session = Depends(get_db), current_user: models.Usuario = Depends(get_current_user)):
-    """Obtiene la lista de todas las mesas y su estado."""
+async def read_mesas(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    formato: Literal["json", "ndjson"] = "json",
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Obtiene las mesas y su estado por id, paginadas por cursor (X-Cursor-Siguiente)."""
     # Podría ser accesible por Meseros y Admin
-    return db.query(models.Mesa).all()
+    consulta = aplicar_keyset(select(models.Mesa), [models.Mesa.id], cursor, [int])
+    if formato == "ndjson":
+        return responder_ndjson(consulta, schemas.Mesa)
+    n = limite(limit)
+    mesas, siguiente = cortar_pagina((await db.scalars(consulta.limit(n + 1))).all(), n, lambda m: (m.id,))
+    poner_cursor(response, siguiente)
+    return responder(mesas, schemas.Mesa, response)
+
+@router.get("/plano", response_model=List[schemas.MesaPlano])
+async def read_plano(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Plano del salón: todas las mesas con su estado, pedido abierto, total y avance de ítems,
+    en una sola consulta. Para mantenerlo al día, suscribirse al tópico 'plano' del WebSocket
+    (mensajes MESA_ACTUALIZADA con la misma fila) antes de pedirlo.
+    """
+    return responder(await get_plano_async(db))
 
 @router.post("/mesas", response_model=schemas.Mesa, status_code=status.HTTP_201_CREATED)
-def create_new_mesa(
+async def create_new_mesa(
     mesa: schemas.MesaCreate,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Crea una nueva mesa. Requiere rol 'admin'."""
     check_admin(current_user)
 
     # Comprobar si ya existe una mesa con ese nombre
-    existing_mesa = db.query(models.Mesa).filter(models.Mesa.nombre == mesa.nombre).first()
+    existing_mesa = await db.scalar(select(models.Mesa.id).where(models.Mesa.nombre == mesa.nombre))
     if existing_mesa:
         raise HTTPException(status_code=400, detail="Ya existe una mesa con este nombre.")
 
     db_mesa = models.Mesa(nombre=mesa.nombre)
     db.add(db_mesa)
-    db.commit()
-    db.refresh(db_mesa)
+    await db.flush()
+    # Los suscriptores del plano la ven aparecer sin recargarlo
+    await db.run_sync(plano.publicar_mesa, db_mesa.id)
+    await db.commit()
+    await db.refresh(db_mesa)
     return db_mesa
+
+# =======================================================
+# DIAGNÓSTICO
+# =======================================================
+
+@router.get("/pool")
+async def read_pool(current_user: Principal = Depends(get_current_user)):
+    """Estado del pool de conexiones de este worker (en uso, libres, overflow, esperas). Requiere rol 'admin'."""
+    check_admin(current_user)
+    return {"async": estado_pool(async_engine.sync_engine), "sync": estado_pool(engine)}
@@ -3,13 +3,18 @@
 Router para pedidos. Se quitaron awaits en llamadas sync y se agregaron controles de permisos.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app import schemas, models
-from app.database import get_db
-from app.crud import create_pedido, marcar_pedido_servido, cerrar_pedido
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import List, Literal, Optional
+from app import crud, idempotencia, schemas, models
+from app.database import get_async_db
+from app.crud import consulta_historial_pedidos, get_historial_pedidos_async
+from app.paginacion import limite, poner_cursor, responder_ndjson
+from app.serializacion import responder
+from app.idempotencia import Idempotencia, idempotencia_de
 from app.main import get_current_user
+from app.principales import Principal
 
 router = APIRouter(
     prefix="/api/v1/pedidos",
@@ -17,7 +22,7 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
-def check_mesero(current_user: models.Usuario):
+def check_mesero(current_user: Principal):
     if current_user.rol.value != models.RolUsuario.mesero.value:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -25,10 +30,11 @@ def check_mesero(current_user: models.Usuario):
         )
 
 @router.post("/", response_model=schemas.Pedido, status_code=status.HTTP_201_CREATED)
-def create_new_pedido(
+async def create_new_pedido(
     pedido: schemas.PedidoCreate,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     check_mesero(current_user)
     if pedido.mesero_id != current_user.id:
@@ -36,26 +42,88 @@ def create_new_pedido(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Solo puedes crear pedidos para tu propio ID de mesero."
         )
-    return create_pedido(db, pedido=pedido)
+    return await idempotencia.ejecutar(
+        db, idem, current_user.id, crud.create_pedido, cuerpo=pedido.model_dump(), pedido=pedido
+    )
+
+@router.post("/{pedido_id}/items", response_model=schemas.ItemsAgregados, status_code=status.HTTP_201_CREATED)
+async def add_items_to_pedido(
+    pedido_id: int,
+    agregar: schemas.ItemsAgregarCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
+):
+    """
+    Agrega una ronda de ítems a un pedido abierto del mesero (en vez de abrir otro pedido
+    en la mesa). Responde sólo con los ítems nuevos y el total actualizado; 409 si el
+    pedido ya se cerró.
+    """
+    check_mesero(current_user)
+    return await idempotencia.ejecutar(
+        db, idem, current_user.id, crud.agregar_items, cuerpo=agregar.model_dump(),
+        pedido_id=pedido_id, items=agregar.items, mesero_id=current_user.id
+    )
+
+@router.get("/historial", response_model=List[schemas.PedidoHistorial])
+async def read_historial(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    formato: Literal["json", "ndjson"] = "json",
+    mesero_id: Optional[int] = None,
+    mesa_id: Optional[int] = None,
+    estado: Optional[models.EstadoPedido] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Historial de pedidos, del más reciente al más antiguo. Paginado por cursor: la
+    cabecera X-Cursor-Siguiente trae el `cursor` de la página siguiente. Con
+    formato=ndjson transmite todos los pedidos desde el cursor, uno por línea.
+    Un mesero sólo ve sus propios pedidos; admin ve todos.
+    """
+    if current_user.rol.value == models.RolUsuario.mesero.value:
+        if mesero_id is not None and mesero_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Solo puedes consultar tus propios pedidos."
+            )
+        mesero_id = current_user.id
+    elif current_user.rol.value != models.RolUsuario.admin.value:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo meseros o administradores pueden consultar el historial."
+        )
+    filtros = dict(cursor=cursor, mesero_id=mesero_id, mesa_id=mesa_id, estado=estado, desde=desde, hasta=hasta)
+    if formato == "ndjson":
+        return responder_ndjson(consulta_historial_pedidos(**filtros), schemas.PedidoHistorial)
+    pedidos, siguiente = await get_historial_pedidos_async(db, limit=limite(limit), **filtros)
+    poner_cursor(response, siguiente)
+    return responder(pedidos, schemas.PedidoHistorial, response)
 
 @router.put("/{pedido_id}/servir", response_model=schemas.Pedido)
-def mark_pedido_servido(
+async def mark_pedido_servido(
     pedido_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     check_mesero(current_user)
-    return marcar_pedido_servido(db, pedido_id=pedido_id)
+    return await idempotencia.ejecutar(db, idem, current_user.id, crud.marcar_pedido_servido, pedido_id=pedido_id)
 
 @router.put("/{pedido_id}/cerrar", response_model=schemas.Pedido)
-def close_pedido(
+async def close_pedido(
     pedido_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     if current_user.rol.value not in [models.RolUsuario.mesero.value, models.RolUsuario.admin.value]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Solo meseros o administradores pueden cerrar pedidos."
         )
-    return cerrar_pedido(db, pedido_id=pedido_id)
+    return await idempotencia.ejecutar(db, idem, current_user.id, crud.cerrar_pedido, pedido_id=pedido_id)
@@ -0,0 +1,41 @@
+# app/routers/reportes.py
+"""
+Router de reportes de ventas. Sólo lee resumen_ventas (ver app/reportes.py): los tableros
+no recorren pedidos ni items_pedido y no compiten con la toma de pedidos.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import List, Literal, Optional
+from app import schemas, models
+from app.database import get_async_db
+from app.reportes import consulta_ventas
+from app.serializacion import responder
+from app.main import get_current_user
+from app.principales import Principal
+
+router = APIRouter(
+    prefix="/api/v1/reportes",
+    tags=["Reportes (Admin)"],
+    dependencies=[Depends(get_current_user)]
+)
+
+def check_admin(current_user: Principal):
+    if current_user.rol.value != models.RolUsuario.admin.value:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo los administradores pueden ver reportes."
+        )
+
+@router.get("/ventas", response_model=List[schemas.FilaVentas])
+async def read_ventas(
+    agrupar: Literal["dia", "mesero", "mesa", "producto"] = "dia",
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Ventas de pedidos cerrados entre `desde` y `hasta` (inclusive), agrupadas por `agrupar`."""
+    check_admin(current_user)
+    return responder((await db.execute(consulta_ventas(agrupar, desde, hasta))).all(), schemas.FilaVentas)
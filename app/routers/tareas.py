@@ -5,12 +5,15 @@ Se agregaron validaciones para 'destino'.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app import schemas, models
-from app.database import get_db
-from app.crud import get_tareas_pendientes, marcar_item_listo
+from app import crud, idempotencia, schemas, models
+from app.database import get_async_db
+from app.crud import get_tareas_pendientes_async
+from app.idempotencia import Idempotencia, idempotencia_de
 from app.main import get_current_user
+from app.principales import Principal
+from app.serializacion import RespuestaJSON
 
 router = APIRouter(
     prefix="/api/v1/tareas",
@@ -18,7 +21,7 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
-def check_produccion(current_user: models.Usuario):
+def check_produccion(current_user: Principal):
     if current_user.rol.value not in [models.RolUsuario.cocina.value, models.RolUsuario.bar.value]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -26,10 +29,10 @@ def check_produccion(current_user: models.Usuario):
         )
 
 @router.get("/pendientes/{destino}", response_model=List[schemas.TareaItem])
-def read_tareas_pendientes(
+async def read_tareas_pendientes(
     destino: str,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     check_produccion(current_user)
     if current_user.rol.value != destino and current_user.rol.value != models.RolUsuario.admin.value:
@@ -37,20 +40,34 @@ def read_tareas_pendientes(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Tu rol '{current_user.rol.value}' no te permite ver tareas de '{destino}'."
         )
-    return get_tareas_pendientes(db, destino=destino)
+    return RespuestaJSON(await get_tareas_pendientes_async(db, destino=destino))
 
 @router.put("/listo/{item_id}", response_model=schemas.ItemPedido)
-def mark_item_as_ready(
+async def mark_item_as_ready(
     item_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
 ):
     check_produccion(current_user)
-    db_item = marcar_item_listo(db, item_id=item_id)
+    # El destino se verifica en el mismo UPDATE: un ítem de otra estación responde 403 sin cambiarse
+    return await idempotencia.ejecutar(
+        db, idem, current_user.id, crud.marcar_item_listo, item_id=item_id, destino=current_user.rol.value
+    )
 
-    if db_item.destino != current_user.rol.value and current_user.rol.value != models.RolUsuario.admin.value:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=f"No tienes permiso para marcar este ítem, pertenece a '{db_item.destino}'."
-        )
-    return db_item
+@router.post("/listos", response_model=schemas.ItemsListos)
+async def mark_items_as_ready(
+    lote: schemas.ItemsListosCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idem: Idempotencia = Depends(idempotencia_de)
+):
+    """
+    Marca varios ítems de mi estación como listos en una sola transacción: `item_ids`, o
+    `pedido_id` para todos los ítems de ese pedido. Responde cuáles cambiaron y cuáles no (y por qué).
+    """
+    check_produccion(current_user)
+    return await idempotencia.ejecutar(
+        db, idem, current_user.id, crud.marcar_items_listos, cuerpo=lote.model_dump(),
+        destino=current_user.rol.value, item_ids=lote.item_ids, pedido_id=lote.pedido_id
+    )
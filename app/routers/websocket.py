@@ -1,25 +1,120 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.websocket_manager import manager
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from app import eventos
+from app.database import AsyncSessionLocal
+from app.main import resolver_principal
+from app.principales import Principal
+from app.websocket_manager import TOPICO_ADMIN, manager, mensaje_evento, puede_suscribirse, topicos_por_rol
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/ws",
     tags=["WebSockets"]
 )
 
+async def _autenticar(websocket: WebSocket) -> Optional[Principal]:
+    """El navegador no puede enviar cabeceras en un WebSocket: el JWT llega como ?token=."""
+    token = websocket.query_params.get("token")
+    if not token:
+        return None
+
+    try:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(resolver_principal, token)
+    except HTTPException:
+        return None
+
+async def _reanudar(websocket: WebSocket, last_seq: Optional[int], topicos: set):
+    """
+    Reenvía lo perdido desde `last_seq` y libera los eventos en vivo retenidos. Termina con
+    AL_DIA (o RESINCRONIZAR si hay que recargar por REST) y el seq desde el que seguir.
+    """
+    perdidos = []
+    async with AsyncSessionLocal() as db:
+        if last_seq is None:
+            # Conexión nueva: sólo se informa el seq actual, el cliente ya cargó su estado
+            eventos_perdidos, ultimo = [], await db.run_sync(eventos.ultimo_seq)
+        else:
+            eventos_perdidos, ultimo = await db.run_sync(
+                eventos.leer_desde, last_seq, None if TOPICO_ADMIN in topicos else topicos
+            )
+    if eventos_perdidos is None:
+        tipo = "RESINCRONIZAR"
+    else:
+        tipo = "AL_DIA"
+        perdidos = [(e["seq"], mensaje_evento(e["tipo"], e["datos"], e["seq"])) for e in eventos_perdidos]
+    perdidos.append((None, json.dumps({"type": tipo, "seq": ultimo})))
+    await manager.liberar(websocket, perdidos)
+
 @router.websocket("/notifications")
 async def websocket_endpoint(websocket: WebSocket):
     """
     Endpoint de WebSocket para recibir notificaciones en tiempo real.
-    (Usado principalmente por el rol 'mesero' para saber cuándo un pedido está listo).
+    Requiere ?token=<JWT>. La conexión queda suscrita a los tópicos de su rol
+    (cocina/bar: su destino; mesero: sus pedidos; admin: todo) y puede pedir más con
+    {"accion": "suscribir", "topicos": ["mesa:3"]} o quitarlos con "desuscribir"
+    ("plano" trae los cambios de todas las mesas).
+
+    Cada evento trae su "seq". Al reconectar, ?last_seq=<último seq recibido> reenvía sólo
+    lo perdido, y ?topicos=plano,mesa:3 suscribe desde el inicio (y reenvía también lo de
+    esos tópicos). Después llega {"type": "AL_DIA", "seq": N}, o "RESINCRONIZAR" si el
+    cliente quedó demasiado atrás y debe recargar por REST. Un evento puede llegar dos
+    veces: se descartan los seq ya vistos.
     """
-    await manager.connect(websocket)
+    principal = await _autenticar(websocket)
+    if principal is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    rol = principal.rol.value
     try:
-        # Loop que mantiene la conexión abierta
-        while True:
-            # Esperamos recibir un mensaje del cliente, aunque no lo usemos. 
+        last_seq = websocket.query_params.get("last_seq")
+        last_seq = None if last_seq is None else int(last_seq)
+    except ValueError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    topicos = topicos_por_rol(principal.id, rol)
+    pedidos = [t for t in websocket.query_params.get("topicos", "").split(",") if t]
+    topicos |= {t for t in pedidos if puede_suscribirse(principal.id, rol, t)}
+    await manager.connect(websocket, topicos, retener=True)
+    try:
+        await _reanudar(websocket, last_seq, topicos)
+        # Loop que mantiene la conexión abierta. Termina si el escritor la desconecta (cliente
+        # lento con WS_POLITICA_LENTO=desconectar, o un envío que falló): ya no está registrada
+        while websocket in manager.active_connections:
             # Si el cliente cierra la conexión, esto lanza WebSocketDisconnect.
             data = await websocket.receive_text()
-            # Opcional: si quisieras recibir comandos del cliente:
-            # await manager.send_personal_message(f"Mensaje recibido: {data}", websocket)
+            conexion = manager.active_connections.get(websocket)
+            if conexion is None:
+                break
+            try:
+                mensaje = json.loads(data)
+            except ValueError:
+                mensaje = None
+            if not isinstance(mensaje, dict) or mensaje.get("accion") not in ("suscribir", "desuscribir"):
+                await manager.send_personal_message(
+                    json.dumps({"type": "PONG", "message": f"Server received: {data}"}), websocket
+                )
+                continue
+            topicos = [str(t) for t in mensaje.get("topicos", [])]
+            if mensaje["accion"] == "desuscribir":
+                manager.desuscribir(websocket, topicos)
+            else:
+                denegados = [t for t in topicos if not puede_suscribirse(principal.id, rol, t)]
+                manager.suscribir(websocket, [t for t in topicos if t not in denegados])
+                if denegados:
+                    await manager.send_personal_message(
+                        json.dumps({"type": "ERROR", "message": "Suscripción no permitida", "topicos": denegados}),
+                        websocket
+                    )
+            await manager.send_personal_message(
+                json.dumps({"type": "SUSCRIPCIONES", "topicos": sorted(conexion.topicos)}),
+                websocket
+            )
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+    except Exception as e:
+        logger.exception("Error en el WebSocket: %s", e)
+        manager.disconnect(websocket)
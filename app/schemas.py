@@ -1,11 +1,14 @@
 # app/schemas.py
 """
-Pydantic schemas para validación. Se usa orm_mode=True en Config para integración con SQLAlchemy.
+Pydantic schemas para validación. Los de respuesta usan from_attributes=True para leer
+objetos de SQLAlchemy. Los listados no pasan por estos modelos fila por fila: se
+serializan con app/serializacion.py, que lee los mismos campos.
 Se corrigieron errores de sintaxis, removed stray paren, y Token definido claramente.
 """
 
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
+from datetime import date, datetime
+from typing import List, Optional, Union
 
 class ProductoCreate(BaseModel):
     nombre: str
@@ -20,8 +23,7 @@ class Producto(BaseModel):
     categoria: str
     disponible: bool
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UsuarioCreate(BaseModel):
     nombre: str
@@ -33,8 +35,7 @@ class Usuario(BaseModel):
     nombre: str
     rol: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class MesaCreate(BaseModel):
     nombre: str
@@ -44,8 +45,18 @@ class Mesa(BaseModel):
     nombre: str
     estado: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class MesaPlano(BaseModel):
+    """Fila del plano del salón; los WebSockets la envían igual en MESA_ACTUALIZADA."""
+    id: int
+    nombre: str
+    estado: str
+    pedido_id: Optional[int] = None
+    pedidos_abiertos: int
+    total: float
+    items_total: int
+    items_listos: int
 
 class ItemPedidoCreate(BaseModel):
     producto_id: int
@@ -63,8 +74,31 @@ class ItemPedido(BaseModel):
     estado: str
     destino: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ItemsAgregarCreate(BaseModel):
+    items: List[ItemPedidoCreate]
+
+class ItemsAgregados(BaseModel):
+    """El pedido tras agregarle ítems; `items` trae sólo los nuevos."""
+    pedido_id: int
+    estado: str
+    total: float
+    items_total: int
+    items: List[ItemPedido]
+
+class ItemsListosCreate(BaseModel):
+    # Uno de los dos: ids puntuales o todos los ítems del pedido para mi destino
+    item_ids: Optional[List[int]] = None
+    pedido_id: Optional[int] = None
+
+class ItemRechazado(BaseModel):
+    id: int
+    motivo: str
+
+class ItemsListos(BaseModel):
+    actualizados: List[ItemPedido]
+    rechazados: List[ItemRechazado] = []
 
 class Pedido(BaseModel):
     id: int
@@ -74,19 +108,19 @@ class Pedido(BaseModel):
     total: float
     items: List[ItemPedido] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class PedidoHistorial(Pedido):
+    fecha_creacion: datetime
 
 class MesaSimple(BaseModel):
     nombre: str
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class PedidoSimple(BaseModel):
     id: int
     mesa: MesaSimple
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class TareaItem(BaseModel):
     id: int
@@ -96,8 +130,14 @@ class TareaItem(BaseModel):
     producto: Producto
     pedido: PedidoSimple
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class FilaVentas(BaseModel):
+    # Día (agrupar=dia) o id del mesero, la mesa o el producto
+    clave: Union[int, date]
+    pedidos: int
+    unidades: int
+    ingresos: float
 
 class Token(BaseModel):
     access_token: str
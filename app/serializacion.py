@@ -0,0 +1,101 @@
+# app/serializacion.py
+"""
+Respuestas JSON armadas directamente a bytes con orjson.
+Con `response_model`, FastAPI valida cada fila contra el schema, la vuelca a tipos de
+Python (enums a str, fechas a texto) y recién entonces la codifica: en los listados (cola
+de cocina, menú, historial) eso se repite por fila y por campo sobre datos que salieron de
+la BD o de las cachés, que ya tienen la forma del schema.
+
+`responder` toma esas filas tal cual: los dicts se codifican sin tocarlos y los objetos
+ORM / filas de SQLAlchemy se leen con un extractor que se arma una vez por schema (qué
+atributos leer y qué campos son schemas anidados). orjson codifica enums, fechas y
+datetimes de forma nativa. Las rutas conservan `response_model` para la documentación
+OpenAPI; al devolver una Response, FastAPI no la vuelve a validar.
+Sólo para datos confiables: los cuerpos de las peticiones se siguen validando.
+"""
+
+import typing
+from collections.abc import Mapping
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Iterable, List, Optional, Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+Extractor = Callable[[Any], Any]
+
+
+def _por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"{type(valor).__name__} no es serializable a JSON")
+
+
+def a_json(contenido: Any) -> bytes:
+    return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RespuestaJSON(Response):
+    """JSONResponse con orjson; también es la clase de respuesta por defecto de la app."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # `responder` ya entrega los bytes
+        if isinstance(content, bytes):
+            return content
+        return a_json(content)
+
+
+def _identidad(valor):
+    return valor
+
+
+def _conversor(anotacion) -> Extractor:
+    """Cómo pasar el valor de un campo: tal cual, o con el extractor del schema anidado."""
+    if typing.get_origin(anotacion) in (typing.Union, getattr(typing, "UnionType", None)):
+        argumentos = [a for a in typing.get_args(anotacion) if a is not type(None)]
+        if len(argumentos) == 1:
+            conversor = _conversor(argumentos[0])
+            return conversor if conversor is _identidad else (lambda v: None if v is None else conversor(v))
+    if typing.get_origin(anotacion) in (list, List):
+        (elemento,) = typing.get_args(anotacion) or (Any,)
+        conversor = _conversor(elemento)
+        return _identidad if conversor is _identidad else (lambda v: [conversor(e) for e in v])
+    if isinstance(anotacion, type) and issubclass(anotacion, BaseModel):
+        return extractor(anotacion)
+    return _identidad
+
+
+@lru_cache(maxsize=None)
+def extractor(esquema: Type[BaseModel]) -> Extractor:
+    """Función fila -> dict para `esquema`, armada una sola vez por schema."""
+    campos = [(nombre, _conversor(campo.annotation)) for nombre, campo in esquema.model_fields.items()]
+
+    def extraer(fila):
+        if isinstance(fila, dict):
+            return fila
+        if isinstance(fila, Mapping):
+            return {nombre: conversor(fila[nombre]) for nombre, conversor in campos}
+        return {nombre: conversor(getattr(fila, nombre)) for nombre, conversor in campos}
+
+    return extraer
+
+
+def responder(filas: Iterable, esquema: Optional[Type[BaseModel]] = None, response: Optional[Response] = None,
+              headers: Optional[dict] = None) -> RespuestaJSON:
+    """
+    Codifica una lista de filas de `esquema` sin validarlas. Sin `esquema`, las filas deben
+    estar ya en tipos JSON (dicts de las cachés). `response` es el Response que inyecta
+    FastAPI: se copian sus cabeceras (X-Cursor-Siguiente), que de otro modo se perderían.
+    """
+    if esquema is not None:
+        extraer = extractor(esquema)
+        filas = [extraer(f) for f in filas]
+    elif not isinstance(filas, list):
+        filas = list(filas)
+    cabeceras = dict(headers or {})
+    if response is not None:
+        cabeceras.update((k, v) for k, v in response.headers.items() if k not in ("content-length", "content-type"))
+    return RespuestaJSON(a_json(filas), headers=cabeceras)
@@ -1,34 +1,212 @@
-from typing import List, Dict
-from fastapi import WebSocket, WebSocketDisconnect
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import WebSocket, WebSocketDisconnect, status
+import asyncio
 import json
+import logging
+import os
+from .metricas import registro
+
+logger = logging.getLogger(__name__)
+
+# Mensajes pendientes por conexión antes de aplicar la política de cliente lento
+WS_COLA_MAX = int(os.environ.get("WS_COLA_MAX", "100"))
+# 'descartar_antiguo' (pierde el mensaje más viejo) o 'desconectar' (cierra con 1013)
+WS_POLITICA_LENTO = os.environ.get("WS_POLITICA_LENTO", "descartar_antiguo")
+# Un envío que tarda más que esto se considera colgado y cierra la conexión
+WS_TIMEOUT_ENVIO_SEG = float(os.environ.get("WS_TIMEOUT_ENVIO_SEG", "10"))
+
+CONEXIONES_ACTIVAS = registro.medidor("ws_conexiones_activas", "WebSockets conectados a este worker")
+MENSAJES_DESCARTADOS = registro.contador(
+    "ws_mensajes_descartados_total", "Mensajes descartados por cola llena (descartar_antiguo)"
+)
+DESCONEXIONES_LENTAS = registro.contador(
+    "ws_desconexiones_lentas_total", "Conexiones cerradas por cola llena (desconectar)"
+)
+
+# Tópico que reciben los administradores: todos los eventos
+TOPICO_ADMIN = "admin"
+# Cambios de todas las mesas (plano del salón); lo piden los meseros que lo muestran
+TOPICO_PLANO = "plano"
+
+def topicos_por_rol(user_id: int, rol: str) -> Set[str]:
+    """Tópicos a los que queda suscrita una conexión al autenticarse, según su rol."""
+    if rol in ("cocina", "bar"):
+        return {f"destino:{rol}"}
+    if rol == "mesero":
+        return {f"mesero:{user_id}"}
+    if rol == "admin":
+        return {TOPICO_ADMIN}
+    return set()
+
+def mensaje_evento(tipo: str, datos: dict, seq: Optional[int] = None) -> str:
+    """Mensaje de WebSocket de un evento del bus; `seq` permite reanudar tras reconectar."""
+    mensaje = {"type": tipo.upper(), "data": datos}
+    if seq is not None:
+        mensaje["seq"] = seq
+    return json.dumps(mensaje)
+
+def puede_suscribirse(user_id: int, rol: str, topico: str) -> bool:
+    """Reglas para suscripciones pedidas por el cliente (p. ej. un mesero siguiendo una mesa)."""
+    if rol == "admin":
+        return True
+    if topico.startswith("mesa:") or topico == TOPICO_PLANO:
+        return rol == "mesero"
+    return topico in topicos_por_rol(user_id, rol)
+
+class Conexion:
+    """
+    Conexión registrada: sus tópicos, una cola de salida acotada y la tarea que la escribe.
+    Así un cliente lento sólo atrasa su propia cola y nunca la entrega a los demás.
+    """
+    __slots__ = ("websocket", "topicos", "cola", "tarea", "retenidos")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.topicos: Set[str] = set()
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=WS_COLA_MAX)
+        self.tarea: Optional[asyncio.Task] = None
+        # Mensajes en vivo (seq, mensaje) guardados mientras se reenvían los perdidos
+        self.retenidos: Optional[List[Tuple[Optional[int], str]]] = None
 
 class ConnectionManager:
     """
     Clase para gestionar las conexiones de WebSockets.
-    Solo almacena conexiones activas y permite enviar mensajes.
+    Cada conexión está suscrita a tópicos ('destino:cocina', 'mesero:7', 'mesa:3', 'admin');
+    un índice tópico -> conexiones permite entregar cada evento sólo a quien corresponde.
+    Enviar sólo encola: cada conexión tiene su propio escritor, y si su cola se llena se
+    aplica WS_POLITICA_LENTO ('descartar_antiguo' o 'desconectar').
     """
-    def __init__(self):
-        # Lista de conexiones WebSocket activas
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, politica: str = WS_POLITICA_LENTO):
+        self.politica = politica
+        # Conexión -> estado (tópicos, cola, escritor); alta y baja O(1)
+        self.active_connections: Dict[WebSocket, Conexion] = {}
+        # Tópico -> conexiones suscritas
+        self._suscriptores: Dict[str, Set[WebSocket]] = defaultdict(set)
 
-    async def connect(self, websocket: WebSocket):
-        """Añade una nueva conexión activa."""
+    async def connect(self, websocket: WebSocket, topicos: Iterable[str] = (), retener: bool = False):
+        """
+        Acepta la conexión, la suscribe a los tópicos indicados y arranca su escritor.
+        Con `retener`, los eventos en vivo quedan en espera hasta `liberar`.
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"WS conectado. Total: {len(self.active_connections)}")
+        conexion = Conexion(websocket)
+        if retener:
+            conexion.retenidos = []
+        self.active_connections[websocket] = conexion
+        self.suscribir(websocket, topicos)
+        conexion.tarea = asyncio.create_task(self._escritor(conexion))
+        CONEXIONES_ACTIVAS.set(len(self.active_connections))
+        logger.debug("WS conectado. Total: %d", len(self.active_connections))
+
+    def suscribir(self, websocket: WebSocket, topicos: Iterable[str]):
+        conexion = self.active_connections[websocket]
+        for topico in topicos:
+            conexion.topicos.add(topico)
+            self._suscriptores[topico].add(websocket)
+
+    def desuscribir(self, websocket: WebSocket, topicos: Iterable[str]):
+        conexion = self.active_connections[websocket]
+        for topico in topicos:
+            conexion.topicos.discard(topico)
+            conexiones = self._suscriptores.get(topico)
+            if conexiones is not None:
+                conexiones.discard(websocket)
+                if not conexiones:
+                    del self._suscriptores[topico]
+
+    async def liberar(self, websocket: WebSocket, mensajes: Iterable[Tuple[int, str]] = ()):
+        """
+        Envía los mensajes (seq, mensaje) reenviados y después encola los retenidos en vivo
+        que no estaban entre ellos: el cliente recibe todo en orden y sin el hueco de la
+        reconexión. Los reenviados van directo al socket, no por la cola: pueden ser hasta
+        EVENTOS_REENVIO_MAX y la cola sólo admite WS_COLA_MAX antes de aplicar
+        WS_POLITICA_LENTO. Mientras tanto el escritor no envía nada (todo queda retenido).
+        """
+        conexion = self.active_connections.get(websocket)
+        if conexion is None:
+            return
+        enviados = set()
+        for seq, message in mensajes:
+            enviados.add(seq)
+            await asyncio.wait_for(websocket.send_text(message), WS_TIMEOUT_ENVIO_SEG)
+        retenidos, conexion.retenidos = conexion.retenidos or [], None
+        for seq, message in retenidos:
+            if seq is None or seq not in enviados:
+                self._encolar(conexion, message)
 
     def disconnect(self, websocket: WebSocket):
-        """Remueve una conexión inactiva."""
-        self.active_connections.remove(websocket)
-        print(f"WS desconectado. Total: {len(self.active_connections)}")
+        """Remueve una conexión inactiva (idempotente) y detiene su escritor."""
+        conexion = self.active_connections.get(websocket)
+        if conexion is None:
+            return
+        self.desuscribir(websocket, list(conexion.topicos))
+        del self.active_connections[websocket]
+        if conexion.tarea is not None and conexion.tarea is not asyncio.current_task():
+            conexion.tarea.cancel()
+        CONEXIONES_ACTIVAS.set(len(self.active_connections))
+        logger.debug("WS desconectado. Total: %d", len(self.active_connections))
+
+    async def _escritor(self, conexion: Conexion):
+        """Vacía la cola de la conexión; si un envío falla o se cuelga, la desconecta."""
+        try:
+            while True:
+                message = await conexion.cola.get()
+                await asyncio.wait_for(conexion.websocket.send_text(message), WS_TIMEOUT_ENVIO_SEG)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning("Error enviando por WebSocket: %s", e)
+            self.disconnect(conexion.websocket)
+            await self._cerrar(conexion.websocket, status.WS_1011_INTERNAL_ERROR)
+
+    async def _cerrar(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _encolar(self, conexion: Conexion, message: str, seq: Optional[int] = None):
+        if conexion.retenidos is not None:
+            conexion.retenidos.append((seq, message))
+            return
+        try:
+            conexion.cola.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self.politica == "desconectar":
+            DESCONEXIONES_LENTAS.inc()
+            self.disconnect(conexion.websocket)
+            asyncio.get_running_loop().create_task(self._cerrar(conexion.websocket, status.WS_1013_TRY_AGAIN_LATER))
+            return
+        # descartar_antiguo: se pierde el mensaje más viejo pendiente, no el nuevo
+        conexion.cola.get_nowait()
+        conexion.cola.put_nowait(message)
+        MENSAJES_DESCARTADOS.inc()
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Envía un mensaje a un cliente específico."""
-        await websocket.send_text(message)
+        """Envía un mensaje a un cliente específico (por su cola, respetando el orden)."""
+        conexion = self.active_connections.get(websocket)
+        if conexion is not None:
+            self._encolar(conexion, message)
 
     async def broadcast(self, message: str):
         """Envía un mensaje a todos los clientes conectados."""
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        for conexion in list(self.active_connections.values()):
+            self._encolar(conexion, message)
+
+    async def publicar(self, topicos: Iterable[str], message: str, seq: Optional[int] = None):
+        """
+        Envía un mensaje sólo a las conexiones suscritas a alguno de los tópicos (y a admin).
+        `seq` es el del evento en la tabla eventos, si lo tiene.
+        """
+        destinatarios: Set[WebSocket] = set()
+        for topico in (*topicos, TOPICO_ADMIN):
+            destinatarios |= self._suscriptores.get(topico, set())
+        for websocket in destinatarios:
+            conexion = self.active_connections.get(websocket)
+            if conexion is not None:
+                self._encolar(conexion, message, seq)
 
 manager = ConnectionManager()
@@ -0,0 +1,16 @@
+# bench/__init__.py
+"""
+Herramientas para antes del deploy.
+
+Medición:
+- servicio: simula un servicio contra la API y reporta peticiones/s, latencias por
+  endpoint y la demora de los avisos por WebSocket.
+
+Comprobaciones (pasa o falla, salen con código 1 si algo no se cumple):
+- presupuesto: sentencias SQL por endpoint dentro de su presupuesto (N+1).
+- invalidacion: los cambios de usuarios llegan a los demás workers.
+- reanudacion: un WebSocket que se reconecta recibe todos los eventos que perdió.
+
+El repo no tiene suite de pruebas: las comprobaciones se corren a mano o en CI con
+`python -m bench.<nombre>`.
+"""
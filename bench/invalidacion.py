@@ -0,0 +1,66 @@
+# bench/invalidacion.py
+"""
+Comprueba que los cambios de usuarios lleguen a los demás workers.
+
+    python -m bench.invalidacion
+
+Las cachés de principales de los otros workers se invalidan con el evento
+'usuario_modificado', que se publica al hacer flush. Debe llegar a `bus._preparar` (el
+que lo registra y, en Postgres, hace el NOTIFY) también cuando el cambio se confirma con
+un commit sin flush explícito. Corre sobre una BD SQLite temporal; sale con código 1 si
+algún caso no llega.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def verificar() -> list:
+    # principales registra los listeners que publican 'usuario_modificado'
+    from app import models, principales  # noqa: F401
+    from app.database import SessionLocal, engine
+    from app.eventos import bus
+
+    models.Base.metadata.create_all(bind=engine)
+    preparados = []
+    preparar = bus._preparar
+
+    def registrar(db, eventos):
+        preparados.extend(e["tipo"] for e in eventos)
+        preparar(db, eventos)
+
+    bus._preparar = registrar
+    fallas = []
+    with SessionLocal() as db:
+        usuario = models.Usuario(nombre="invalidacion", pin="-", rol=models.RolUsuario.mesero)
+        db.add(usuario)
+        db.commit()
+        for caso, cambiar in (
+            ("cambio de rol", lambda: setattr(usuario, "rol", models.RolUsuario.cocina)),
+            ("borrado", lambda: db.delete(usuario)),
+        ):
+            preparados.clear()
+            cambiar()
+            db.commit()
+            if "usuario_modificado" not in preparados:
+                fallas.append(f"{caso}: 'usuario_modificado' no llegó a bus._preparar")
+    return fallas
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directorio:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directorio, 'invalidacion.db')}"
+        sys.path.insert(0, str(RAIZ))
+        fallas = verificar()
+    if fallas:
+        print("\n".join(fallas))
+        raise SystemExit(1)
+    print("Los cambios de usuarios se publican a los demás workers.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# bench/presupuesto.py
+"""
+Presupuesto de sentencias SQL por endpoint, para frenar los N+1 antes del deploy.
+
+    python -m bench.presupuesto                    # escalas 1, 10 y 100
+    python -m bench.presupuesto --escalas 1 100 --detalle
+
+Cada escala corre en un subproceso con su propia BD SQLite temporal (las cachés en memoria
+de la app son por proceso). Se siembran n productos por destino, n mesas y n pedidos
+abiertos (n ítems pendientes por destino, n pedidos en el historial), y los pedidos que
+las rutas de escritura modifican tienen n ítems. Cada ruta se llama dos veces y se miden
+las dos: la primera con las cachés en memoria vacías (catálogo, principales, cola de
+tareas), así se cuenta también la recarga desde la BD, y la segunda con las cachés ya
+cargadas por la primera.
+
+El presupuesto de cada ruta es el mismo en todas las escalas: una ruta que consulta una
+vez por fila lo supera al crecer n. `en_frio` es el de la llamada con cachés vacías (si
+no se indica, el mismo de la llamada caliente). Toda ruta HTTP de la app debe tener su
+caso en CASOS; una ruta nueva sin caso también falla. Sale con código 1 si algo falla.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+RAIZ = Path(__file__).resolve().parent.parent
+PIN = "1234"
+ESCALAS = (1, 10, 100)
+USUARIOS = {"mesero": "p_mesero", "cocina": "p_cocina", "bar": "p_bar", "admin": "p_admin"}
+
+
+@dataclass
+class Contexto:
+    """Datos sembrados y utilidades para que cada caso arme sus peticiones."""
+    n: int
+    ids: dict
+    cabeceras: Dict[str, dict]
+    sesion: Callable
+
+    def pedido(self, items: Optional[int] = None, destino: Optional[str] = None) -> dict:
+        """Crea un pedido abierto con `items` ítems (n por defecto) en una mesa nueva."""
+        from app import crud, models, schemas
+        productos = self.ids["productos"][destino] if destino else self.ids["productos"]["cocina"] + \
+            self.ids["productos"]["bar"]
+        with self.sesion() as db:
+            mesa = models.Mesa(nombre=f"fixture-{time.perf_counter_ns()}")
+            db.add(mesa)
+            db.commit()
+            return crud.create_pedido(db, schemas.PedidoCreate(
+                mesa_id=mesa.id, mesero_id=self.ids["mesero"],
+                items=[{"producto_id": productos[i % len(productos)], "cantidad": 1} for i in range(items or self.n)],
+            ))
+
+    def cuerpo_items(self) -> list:
+        productos = self.ids["productos"]["cocina"] + self.ids["productos"]["bar"]
+        return [{"producto_id": productos[i % len(productos)], "cantidad": 1} for i in range(self.n)]
+
+    def cuerpo_pedido(self) -> dict:
+        from app import models
+        with self.sesion() as db:
+            mesa = models.Mesa(nombre=f"libre-{time.perf_counter_ns()}")
+            db.add(mesa)
+            db.commit()
+            return {"mesa_id": mesa.id, "mesero_id": self.ids["mesero"], "items": self.cuerpo_items()}
+
+
+# Arma (url, kwargs) de la i-ésima llamada (0: cachés vacías, 1: cachés cargadas)
+Peticion = Callable[[Contexto, int], Tuple[str, dict]]
+
+
+@dataclass
+class Caso:
+    presupuesto: int
+    usuario: Optional[str]
+    peticion: Peticion
+    en_frio: Optional[int] = None
+
+    @property
+    def presupuesto_en_frio(self) -> int:
+        return self.presupuesto if self.en_frio is None else self.en_frio
+
+
+def _fija(url: str, **kwargs) -> Peticion:
+    return lambda ctx, i: (url, kwargs)
+
+
+def _producto(ctx: Contexto, i: int, url: str):
+    return url, {"json": {"nombre": f"Plato {ctx.n}-{i}-{time.perf_counter_ns()}", "precio": 5.0,
+                          "categoria": "comida"}}
+
+
+def _item(url: str, destino: str) -> Peticion:
+    return lambda ctx, i: (url.format(id=ctx.pedido(destino=destino)["items"][0]["id"]), {})
+
+
+def _pedido(url: str) -> Peticion:
+    return lambda ctx, i: (url.format(id=ctx.pedido()["id"]), {})
+
+
+def _servido(url: str) -> Peticion:
+    """Pedido ya servido, para medir el cierre."""
+    def peticion(ctx: Contexto, i: int):
+        from app import crud
+        pedido = ctx.pedido()
+        with ctx.sesion() as db:
+            crud.marcar_pedido_servido(db, pedido["id"])
+        return url.format(id=pedido["id"]), {}
+    return peticion
+
+
+# (método, ruta) -> caso. Las de lectura van primero: miden sobre exactamente n filas.
+CASOS: Dict[Tuple[str, str], Caso] = {
+    ("GET", "/"): Caso(0, None, _fija("/")),
+    ("GET", "/health"): Caso(0, None, _fija("/health"), en_frio=1),
+    ("GET", "/metrics"): Caso(0, None, _fija("/metrics")),
+    ("GET", "/productos/"): Caso(0, None, _fija("/productos/"), en_frio=1),
+    ("GET", "/api/v1/gestion/productos"): Caso(0, "mesero", _fija("/api/v1/gestion/productos"), en_frio=2),
+    ("GET", "/api/v1/gestion/mesas"): Caso(1, "mesero", _fija("/api/v1/gestion/mesas"), en_frio=2),
+    ("GET", "/api/v1/gestion/plano"): Caso(1, "mesero", _fija("/api/v1/gestion/plano"), en_frio=2),
+    ("GET", "/api/v1/gestion/pool"): Caso(0, "admin", _fija("/api/v1/gestion/pool"), en_frio=1),
+    ("GET", "/api/v1/pedidos/historial"): Caso(2, "mesero", _fija("/api/v1/pedidos/historial"), en_frio=3),
+    ("GET", "/api/v1/reportes/ventas"): Caso(1, "admin", _fija("/api/v1/reportes/ventas"), en_frio=2),
+    ("GET", "/tareas/cocina/"): Caso(0, "cocina", _fija("/tareas/cocina/"), en_frio=2),
+    ("GET", "/tareas/bar/"): Caso(0, "bar", _fija("/tareas/bar/"), en_frio=2),
+    ("GET", "/api/v1/tareas/pendientes/{destino}"): Caso(
+        0, "cocina", _fija("/api/v1/tareas/pendientes/cocina"), en_frio=2
+    ),
+    ("POST", "/token/"): Caso(1, None, _fija("/token/", data={"username": USUARIOS["mesero"], "password": PIN})),
+    ("POST", "/productos/"): Caso(3, "admin", lambda ctx, i: _producto(ctx, i, "/productos/"), en_frio=4),
+    ("POST", "/api/v1/gestion/productos"): Caso(
+        4, "admin", lambda ctx, i: _producto(ctx, i, "/api/v1/gestion/productos"),
+        en_frio=5,
+    ),
+    ("POST", "/api/v1/gestion/mesas"): Caso(
+        5, "admin", lambda ctx, i: ("/api/v1/gestion/mesas", {"json": {"nombre": f"nueva-{time.perf_counter_ns()}"}}),
+        en_frio=6,
+    ),
+    ("POST", "/pedidos/"): Caso(9, "mesero", lambda ctx, i: ("/pedidos/", {"json": ctx.cuerpo_pedido()}), en_frio=10),
+    ("POST", "/api/v1/pedidos/"): Caso(
+        9, "mesero", lambda ctx, i: ("/api/v1/pedidos/", {"json": ctx.cuerpo_pedido()}),
+        en_frio=10,
+    ),
+    ("POST", "/api/v1/pedidos/{pedido_id}/items"): Caso(8, "mesero", lambda ctx, i: (
+        f"/api/v1/pedidos/{ctx.pedido(items=1)['id']}/items", {"json": {"items": ctx.cuerpo_items()}}
+    ), en_frio=9),
+    ("PUT", "/item-pedido/{item_id}/listo"): Caso(6, "cocina", _item("/item-pedido/{id}/listo", "cocina"), en_frio=7),
+    ("PUT", "/api/v1/tareas/listo/{item_id}"): Caso(
+        6, "cocina", _item("/api/v1/tareas/listo/{id}", "cocina"), en_frio=7
+    ),
+    ("POST", "/api/v1/tareas/listos"): Caso(6, "cocina", lambda ctx, i: (
+        "/api/v1/tareas/listos", {"json": {"pedido_id": ctx.pedido(destino="cocina")["id"]}}
+    ), en_frio=7),
+    ("PUT", "/pedidos/{pedido_id}/servido"): Caso(7, "mesero", _pedido("/pedidos/{id}/servido"), en_frio=8),
+    ("PUT", "/api/v1/pedidos/{pedido_id}/servir"): Caso(7, "mesero", _pedido("/api/v1/pedidos/{id}/servir"), en_frio=8),
+    ("PUT", "/pedidos/{pedido_id}/cerrado"): Caso(9, "mesero", _servido("/pedidos/{id}/cerrado"), en_frio=10),
+    ("PUT", "/api/v1/pedidos/{pedido_id}/cerrar"): Caso(
+        9, "mesero", _servido("/api/v1/pedidos/{id}/cerrar"), en_frio=10
+    ),
+}
+
+
+# === SUBPROCESO: UNA ESCALA ===
+def _sembrar(n: int) -> dict:
+    from app import auth, crud, models, schemas
+    from app.database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        pin = auth.get_password_hash(PIN)
+        usuarios = {rol: models.Usuario(nombre=nombre, pin=pin, rol=models.RolUsuario(rol))
+                    for rol, nombre in USUARIOS.items()}
+        productos = {
+            "cocina": [models.Producto(nombre=f"comida-{i}", precio=10.0, categoria=models.CategoriaProducto.comida)
+                       for i in range(n)],
+            "bar": [models.Producto(nombre=f"bebida-{i}", precio=4.0,
+                                    categoria=models.CategoriaProducto.bebestible_general) for i in range(n)],
+        }
+        mesas = [models.Mesa(nombre=f"mesa-{i}") for i in range(n)]
+        db.add_all([*usuarios.values(), *productos["cocina"], *productos["bar"], *mesas])
+        db.commit()
+        ids = {
+            "mesero": usuarios["mesero"].id,
+            "productos": {d: [p.id for p in lista] for d, lista in productos.items()},
+        }
+        for i, mesa in enumerate(mesas):
+            crud.create_pedido(db, schemas.PedidoCreate(mesa_id=mesa.id, mesero_id=ids["mesero"], items=[
+                {"producto_id": ids["productos"]["cocina"][i], "cantidad": 1},
+                {"producto_id": ids["productos"]["bar"][i], "cantidad": 1},
+            ]))
+        # Ventas de un pedido cerrado para que el reporte tenga filas
+        crud.cerrar_pedido(db, crud.create_pedido(db, schemas.PedidoCreate(
+            mesa_id=mesas[0].id, mesero_id=ids["mesero"],
+            items=[{"producto_id": ids["productos"]["cocina"][0], "cantidad": 1}],
+        ))["id"])
+    return ids
+
+
+def rutas_http(app) -> List[Tuple[str, str]]:
+    from fastapi.routing import APIRoute
+    return sorted(
+        (metodo, ruta.path) for ruta in app.routes if isinstance(ruta, APIRoute)
+        for metodo in ruta.methods if metodo != "HEAD"
+    )
+
+
+def vaciar_caches():
+    """Deja las cachés en memoria como en un worker recién iniciado."""
+    from app.catalogo import catalogo
+    from app.cola_tareas import cola_tareas
+    from app.principales import principales
+    catalogo.invalidar()
+    cola_tareas.invalidar()
+    principales.invalidar()
+
+
+def medir_escala(n: int) -> dict:
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from app import database
+    from app.main import app
+
+    sentencias = [0]
+
+    def contar(*_):
+        sentencias[0] += 1
+
+    ids = _sembrar(n)
+    resultado = {"sin_caso": [f"{m} {r}" for m, r in rutas_http(app) if (m, r) not in CASOS], "rutas": {}}
+    with TestClient(app) as cliente:
+        # Deja terminar la primera vuelta de los bucles de fondo antes de contar
+        time.sleep(0.5)
+        for motor in (database.engine, database.async_engine.sync_engine):
+            event.listen(motor, "after_cursor_execute", contar)
+        cabeceras = {}
+        for rol, nombre in USUARIOS.items():
+            token = cliente.post("/token/", data={"username": nombre, "password": PIN}).json()["access_token"]
+            cabeceras[rol] = {"Authorization": f"Bearer {token}"}
+        ctx = Contexto(n, ids, cabeceras, database.SessionLocal)
+
+        for (metodo, ruta), caso in CASOS.items():
+            medidas = []
+            for i in range(2):
+                url, kwargs = caso.peticion(ctx, i)
+                if caso.usuario is not None:
+                    kwargs = {**kwargs, "headers": cabeceras[caso.usuario]}
+                if i == 0:
+                    vaciar_caches()
+                sentencias[0] = 0
+                respuesta = cliente.request(metodo, url, **kwargs)
+                medidas.append((sentencias[0], respuesta.status_code))
+            resultado["rutas"][f"{metodo} {ruta}"] = {
+                "sentencias": medidas[1][0], "en_frio": medidas[0][0], "codigo": max(medidas[0][1], medidas[1][1]),
+            }
+    return resultado
+
+
+# === PROCESO PRINCIPAL ===
+def _par(en_frio: int, caliente: int) -> str:
+    return f"{en_frio}/{caliente}"
+
+
+def correr_escala(n: int, directorio: str) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(directorio, f'presupuesto_{n}.db')}",
+        "HASH_EJECUTOR": "hilos",
+        # Sin avisos de N+1 en la salida: aquí el límite es el presupuesto de cada caso
+        "CONSULTAS_PRESUPUESTO": "0",
+    }
+    proceso = subprocess.run(
+        [sys.executable, "-m", "bench.presupuesto", "--escala-interna", str(n)],
+        cwd=RAIZ, env=env, capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        sys.stderr.write(proceso.stderr)
+        raise SystemExit(f"La escala {n} terminó con código {proceso.returncode}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica el presupuesto de sentencias SQL de cada endpoint.")
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS))
+    parser.add_argument("--detalle", action="store_true", help="muestra también las rutas dentro del presupuesto")
+    parser.add_argument("--escala-interna", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.escala_interna is not None:
+        sys.path.insert(0, str(RAIZ))
+        print(json.dumps(medir_escala(args.escala_interna)))
+        return
+
+    with tempfile.TemporaryDirectory() as directorio:
+        resultados = {n: correr_escala(n, directorio) for n in args.escalas}
+
+    fallas = []
+    for ruta in sorted({r for res in resultados.values() for r in res["sin_caso"]}):
+        fallas.append(f"{ruta}: sin caso en bench/presupuesto.py CASOS")
+    filas = []
+    for (metodo, ruta), caso in CASOS.items():
+        nombre = f"{metodo} {ruta}"
+        medidas = [resultados[n]["rutas"][nombre] for n in args.escalas]
+        problemas = []
+        for n, m in zip(args.escalas, medidas):
+            if m["codigo"] >= 400:
+                problemas.append(f"n={n}: HTTP {m['codigo']}")
+                continue
+            if m["en_frio"] > caso.presupuesto_en_frio:
+                problemas.append(f"n={n}: {m['en_frio']} sentencias en frío")
+            if m["sentencias"] > caso.presupuesto:
+                problemas.append(f"n={n}: {m['sentencias']} sentencias")
+        if problemas:
+            fallas.append(f"{nombre} (presupuesto {_par(caso.presupuesto_en_frio, caso.presupuesto)}): "
+                          f"{', '.join(problemas)}")
+        if problemas or args.detalle:
+            columnas = " ".join(f"{_par(m['en_frio'], m['sentencias']):>7}" for m in medidas)
+            filas.append(f"{nombre:52} {_par(caso.presupuesto_en_frio, caso.presupuesto):>7} {columnas}"
+                         f"{'  <-- FALLA' if problemas else ''}")
+    if filas:
+        print("Sentencias con cachés vacías/cargadas\n")
+        print(f"{'ruta':52} {'presup.':>7} " + " ".join(f"{'n=' + str(n):>7}" for n in args.escalas))
+        print("\n".join(filas))
+
+    if fallas:
+        print("\nFuera de presupuesto:")
+        for falla in fallas:
+            print(f"  {falla}")
+        raise SystemExit(1)
+    print(f"\n{len(CASOS)} rutas dentro del presupuesto en las escalas {', '.join(map(str, args.escalas))}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench/reanudacion.py
+"""
+Comprueba que un WebSocket que se reconecta con ?last_seq=N reciba todo lo que perdió.
+
+    python -m bench.reanudacion
+
+El cliente se reconecta con más eventos perdidos que WS_COLA_MAX (la cola de salida de la
+conexión) y con más de EVENTOS_REENVIO_MAX eventos de otros tópicos en el medio. Debe
+recibir todos sus eventos, en orden, y después AL_DIA: ni mensajes descartados por la
+política de clientes lentos, ni un RESINCRONIZAR causado por eventos que no son suyos.
+Corre sobre una BD SQLite temporal; sale con código 1 si algo falla.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+PIN = "1234"
+
+
+def verificar() -> list:
+    from fastapi.testclient import TestClient
+
+    from app import auth, models
+    from app.database import SessionLocal, engine
+    from app.eventos import EVENTOS_REENVIO_MAX, bus
+    from app.main import app
+    from app.websocket_manager import WS_COLA_MAX
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        mesero = models.Usuario(nombre="reanudacion", pin=auth.get_password_hash(PIN), rol=models.RolUsuario.mesero)
+        db.add(mesero)
+        db.commit()
+        propios = WS_COLA_MAX + 50
+        # Intercalados: los de otros tópicos no deben contar para el tope de reenvío
+        for i in range(max(propios, EVENTOS_REENVIO_MAX + 1)):
+            if i < propios:
+                bus.publicar(db, "prueba", {"i": i}, topicos=[f"mesero:{mesero.id}"])
+            bus.publicar(db, "prueba", {"i": -1}, topicos=["destino:cocina"])
+        db.commit()
+
+    fallas = []
+    with TestClient(app) as cliente:
+        token = cliente.post("/token/", data={"username": "reanudacion", "password": PIN}).json()["access_token"]
+        with cliente.websocket_connect(f"/ws/notifications?token={token}&last_seq=0") as ws:
+            recibidos = []
+            while True:
+                mensaje = json.loads(ws.receive_text())
+                if mensaje["type"] in ("AL_DIA", "RESINCRONIZAR"):
+                    break
+                recibidos.append(mensaje["data"]["i"])
+    if mensaje["type"] != "AL_DIA":
+        fallas.append(f"se esperaba AL_DIA y llegó {mensaje['type']}")
+    if recibidos != list(range(propios)):
+        fallas.append(f"se esperaban los {propios} eventos perdidos en orden y llegaron {len(recibidos)}"
+                      + (f", desde el {recibidos[0]}" if recibidos else ""))
+    return fallas
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directorio:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directorio, 'reanudacion.db')}"
+        os.environ.setdefault("HASH_EJECUTOR", "hilos")
+        sys.path.insert(0, str(RAIZ))
+        fallas = verificar()
+    if fallas:
+        print("\n".join(fallas))
+        raise SystemExit(1)
+    print("Los eventos perdidos se reenvían completos al reconectar.")
+
+
+if __name__ == "__main__":
+    main()
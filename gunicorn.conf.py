@@ -0,0 +1,56 @@
+# gunicorn.conf.py
+"""
+Configuración de gunicorn para producción (start.sh).
+
+- preload_app: el maestro importa la app una vez y los workers la heredan con fork, en
+  vez de importarla cada uno por su cuenta.
+- Antes de crear los workers, el maestro deja el esquema en la última revisión de Alembic
+  (ESQUEMA_AL_INICIAR=migrar, por defecto), sólo lo verifica (=verificar: no arranca si
+  hay migraciones pendientes) o no hace nada (=no). Ver app/esquema.py.
+- Mide el arranque: import de la app y migraciones en el maestro, y el tiempo de cada
+  worker desde el fork hasta quedar listo (log y métrica arranque_segundos en /metrics).
+"""
+
+import logging
+import os
+import time
+
+_INICIO = time.monotonic()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+ESQUEMA_AL_INICIAR = os.environ.get("ESQUEMA_AL_INICIAR", "migrar")
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def on_starting(server):
+    # Con preload_app la app ya se importó cuando gunicorn llama a este hook
+    importacion = time.monotonic() - _INICIO
+    os.environ["ARRANQUE_IMPORT_SEG"] = f"{importacion:.3f}"
+
+    from app import esquema
+
+    inicio = time.monotonic()
+    if ESQUEMA_AL_INICIAR == "migrar":
+        revision = esquema.migrar()
+    elif ESQUEMA_AL_INICIAR == "verificar":
+        revision = esquema.verificar_esquema()
+    else:
+        revision = "sin verificar"
+    logger.info(
+        "App importada en %.2f s; esquema %s en %.2f s (%s)",
+        importacion, revision, time.monotonic() - inicio, ESQUEMA_AL_INICIAR,
+    )
+
+
+def when_ready(server):
+    logger.info("Maestro listo en %.2f s; creando %d workers", time.monotonic() - _INICIO, workers)
+
+
+def post_fork(server, worker):
+    # Lo lee app.main al terminar el startup del worker
+    os.environ["ARRANQUE_FORK"] = repr(time.time())
@@ -1,9 +1,8 @@
 #!/bin/bash
 # start.sh
+set -e
 
-# 1. Comando para crear las tablas de la BD si no existen
-# Esto es temporal, se reemplazará por Alembic en un proyecto real.
-python -c "from app.database import engine; from app.models import Base; Base.metadata.create_all(bind=engine)"
-
-# 2. Iniciar el servidor web de producción
-gunicorn app.main:app --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT
\ No newline at end of file
+# Servidor web de producción (configuración en gunicorn.conf.py).
+# El maestro importa la app una vez (preload) y aplica las migraciones de Alembic
+# pendientes antes de crear los workers; ESQUEMA_AL_INICIAR=verificar sólo lo comprueba.
+exec gunicorn app.main:app --config gunicorn.conf.py